@@ -0,0 +1,169 @@
+"""Benchmark suite for the pyicloud services against a local fake iCloud.
+
+Reports throughput, latency and peak Python memory for each service
+operation. No network access or Apple account is needed. The server runs
+in a child process, so the memory column only covers the client.
+
+Usage:
+    python benchmarks/bench_services.py --photos 200000 --contacts 50000
+"""
+from __future__ import print_function
+import argparse
+import itertools
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from fake_icloud import FakeICloudProcess
+
+
+def login(server, cookie_directory):
+    """Authenticates from scratch; returns (api, items)."""
+    api = server.service_class()(
+        "bench@example.com",
+        "password",
+        cookie_directory=cookie_directory,
+        session_save_delay=0,
+    )
+    return api, 1
+
+
+def find_my_refresh(api, args):
+    """Refreshes all Find My devices."""
+    devices = api.devices
+    devices.refresh_client()
+    return len(devices.keys())
+
+
+def find_my_status(api, args):
+    """Reads the status of every device, like the GUI device list."""
+    devices = api.devices
+    for device in devices.values():
+        device.status()
+    return len(devices.keys())
+
+
+def photos_listing(api, args):
+    """Pages through "All Photos"."""
+    count = 0
+    for photo in itertools.islice(api.photos.all.photos, args.photos):
+        photo.filename  # pylint: disable=pointless-statement
+        count += 1
+    return count
+
+
+def contacts_all(api, args):
+    """Downloads every contact."""
+    return len(api.contacts.all())
+
+
+def drive_walk(api, args):
+    """Walks the whole iCloud Drive tree."""
+    count = 0
+    stack = [api.drive.root]
+    while stack:
+        node = stack.pop()
+        for child in node.get_children():
+            count += 1
+            if child.type == "folder":
+                stack.append(child)
+    return count
+
+
+def calendar_events(api, args):
+    """Fetches this month's events."""
+    return len(api.calendar.events())
+
+
+def reminders_refresh(api, args):
+    """Fetches reminders."""
+    return sum(len(items) for items in api.reminders.lists.values())
+
+
+OPERATIONS = [
+    find_my_refresh,
+    find_my_status,
+    photos_listing,
+    contacts_all,
+    drive_walk,
+    calendar_events,
+    reminders_refresh,
+]
+
+
+def measure(func, *args):
+    """Runs func, returns (result, seconds, peak bytes)."""
+    tracemalloc.start()
+    started = time.time()
+    try:
+        result = func(*args)
+    finally:
+        elapsed = time.time() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--photos", type=int, default=5000)
+    parser.add_argument("--contacts", type=int, default=5000)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--drive-depth", type=int, default=3)
+    parser.add_argument("--drive-fanout", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--only", action="append", default=None, help="Operation(s) to run"
+    )
+    args = parser.parse_args()
+
+    server = FakeICloudProcess(
+        photos=args.photos,
+        contacts=args.contacts,
+        devices=args.devices,
+        drive_depth=args.drive_depth,
+        drive_fanout=args.drive_fanout,
+    ).start()
+    cookie_directory = tempfile.mkdtemp()
+    try:
+        results = []
+        (api, items), elapsed, peak = measure(login, server, cookie_directory)
+        results.append(("login", [(items, elapsed, peak)]))
+        for operation in OPERATIONS:
+            if args.only and operation.__name__ not in args.only:
+                continue
+            runs = [
+                measure(operation, api, args) for _ in range(args.repeat)
+            ]
+            results.append((operation.__name__, runs))
+
+        print(
+            "%-20s %9s %10s %10s %10s %12s %10s"
+            % ("operation", "items", "min ms", "mean ms", "max ms", "items/s", "peak MB")
+        )
+        for name, runs in results:
+            items = runs[0][0]
+            timings = [elapsed for (_, elapsed, _) in runs]
+            mean = sum(timings) / len(timings)
+            print(
+                "%-20s %9d %10.1f %10.1f %10.1f %12.0f %10.2f"
+                % (
+                    name,
+                    items,
+                    min(timings) * 1000,
+                    mean * 1000,
+                    max(timings) * 1000,
+                    items / mean if mean else 0,
+                    max(peak for (_, _, peak) in runs) / 1e6,
+                )
+            )
+        print()
+        print(api.session.metrics.format())
+    finally:
+        server.stop()
+        shutil.rmtree(cookie_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
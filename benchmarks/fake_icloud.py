@@ -0,0 +1,461 @@
+"""Local stand-in for the iCloud web services used by pyicloud.
+
+Serves the authentication endpoints (signin, accountLogin, validate), Find
+My refreshClient, CloudKit records/query and query/batch for Photos,
+drivews/docws, contacts startup/contacts, calendar events/startup and
+reminders rd/startup, with synthetic data generated at a configurable
+scale. Every webservice lives under its own path prefix on one local port.
+
+Usage:
+    server = FakeICloudServer(photos=200000, contacts=50000)
+    server.start()
+    api = server.service_class()("user@example.com", "password")
+
+`FakeICloudProcess` runs the same server in a child process, so that it
+doesn't show up in the client's CPU and memory measurements. It's also
+runnable on its own:
+
+    python benchmarks/fake_icloud.py --port 8123 --photos 200000
+"""
+from __future__ import print_function
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from six.moves.urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pyicloud import PyiCloudService  # noqa: E402
+
+WEBSERVICES = (
+    "findme",
+    "ckdatabasews",
+    "drivews",
+    "docws",
+    "contacts",
+    "calendar",
+    "reminders",
+    "account",
+    "ubiquity",
+)
+
+
+class FakeICloudData(object):
+    """Deterministic synthetic account data."""
+
+    def __init__(
+        self,
+        photos=1000,
+        contacts=1000,
+        devices=10,
+        drive_depth=3,
+        drive_fanout=5,
+        drive_files=10,
+        events=100,
+        reminders=100,
+    ):
+        self.photos = photos
+        self.contacts = contacts
+        self.devices = devices
+        self.drive_depth = drive_depth
+        self.drive_fanout = drive_fanout
+        self.drive_files = drive_files
+        self.events = events
+        self.reminders = reminders
+        self.refreshes = 0
+        self._contacts_body = None
+
+    def account_data(self, base_url):
+        webservices = {
+            key: {"url": "%s/%s" % (base_url, key), "status": "active"}
+            for key in WEBSERVICES
+        }
+        return {
+            "dsInfo": {"dsid": "1234567890", "hsaVersion": 0},
+            "hsaTrustedBrowser": True,
+            "hsaChallengeRequired": False,
+            "webservices": webservices,
+            "apps": {"find": {"canLaunchWithOneFactor": True}},
+        }
+
+    def find_my_device(self, index):
+        # One device in ten moves between two refreshes
+        moves = (self.refreshes + index) // 10
+        return {
+            "id": "device-%d" % index,
+            "name": "Device %d" % index,
+            "deviceDisplayName": "iPhone",
+            "deviceStatus": "200",
+            "batteryLevel": (index % 100) / 100.0,
+            "batteryStatus": "NotCharging",
+            "isLocating": False,
+            "location": {
+                "latitude": 40.0 + index / 1000.0,
+                "longitude": -70.0 - (index + moves) / 1000.0,
+                "timeStamp": 1600000000000 + moves,
+                "positionType": "GPS",
+                "isInaccurate": False,
+            },
+        }
+
+    def find_my(self, client_context=None):
+        self.refreshes += 1
+        selected = (client_context or {}).get("selectedDevice", "all")
+        if selected == "all":
+            indexes = range(self.devices)
+        else:
+            indexes = [int(selected.rsplit("-", 1)[-1])]
+        return {
+            "content": [self.find_my_device(index) for index in indexes],
+            "serverContext": {"deviceListVersion": self.devices},
+            "statusCode": "200",
+        }
+
+    def photo_records(self, offset, limit, direction):
+        step = -1 if direction == "DESCENDING" else 1
+        records = []
+        for index in range(offset, offset + step * limit, step):
+            if index < 0 or index >= self.photos:
+                break
+            name = "master-%d" % index
+            filename = base64.b64encode(b"IMG_%05d.JPG" % index).decode()
+            records.append(
+                {
+                    "recordName": "asset-%d" % index,
+                    "recordType": "CPLAsset",
+                    "fields": {
+                        "masterRef": {"value": {"recordName": name}},
+                        "assetDate": {"value": 1500000000000 + index * 1000},
+                        "addedDate": {"value": 1500000000000 + index * 1000},
+                    },
+                }
+            )
+            records.append(
+                {
+                    "recordName": name,
+                    "recordType": "CPLMaster",
+                    "recordChangeTag": "tag",
+                    "fields": {
+                        "filenameEnc": {"value": filename},
+                        "resOriginalWidth": {"value": 4032},
+                        "resOriginalHeight": {"value": 3024},
+                        "resOriginalFileType": {"value": "public.jpeg"},
+                        "resOriginalRes": {
+                            "value": {
+                                "size": 2000000 + index,
+                                "downloadURL": "https://example.invalid/%s" % name,
+                            }
+                        },
+                    },
+                }
+            )
+        return records
+
+    def drive_node(self, node_id):
+        depth = 0 if node_id == "root" else node_id.count("-")
+        items = []
+        if depth < self.drive_depth:
+            for index in range(self.drive_fanout):
+                child_id = "%s-%d" % ("d" if node_id == "root" else node_id, index)
+                items.append(
+                    {
+                        "drivewsid": "FOLDER::com.apple.CloudDocs::%s" % child_id,
+                        "docwsid": child_id,
+                        "name": "Folder %d" % index,
+                        "type": "FOLDER",
+                        "etag": "1",
+                    }
+                )
+        for index in range(self.drive_files):
+            file_id = "%s-f%d" % (node_id, index)
+            items.append(
+                {
+                    "drivewsid": "FILE::com.apple.CloudDocs::%s" % file_id,
+                    "docwsid": file_id,
+                    "name": "file%d" % index,
+                    "extension": "txt",
+                    "type": "FILE",
+                    "size": 1024,
+                    "etag": "1",
+                    "dateModified": "2020-01-01T00:00:00Z",
+                }
+            )
+        return {
+            "drivewsid": "FOLDER::com.apple.CloudDocs::%s" % node_id,
+            "docwsid": node_id,
+            "name": "root" if node_id == "root" else "Folder",
+            "type": "FOLDER",
+            "etag": "1",
+            "items": items,
+        }
+
+    def contacts_body(self):
+        if self._contacts_body is None:
+            self._contacts_body = json.dumps(
+                {
+                    "contacts": [
+                        {
+                            "contactId": "contact-%d" % index,
+                            "firstName": "First%d" % index,
+                            "lastName": "Last%d" % index,
+                            "phones": [
+                                {"label": "MOBILE", "field": "+1555%07d" % index}
+                            ],
+                            "emailAddresses": [
+                                {"label": "HOME", "field": "c%d@example.com" % index}
+                            ],
+                        }
+                        for index in range(self.contacts)
+                    ],
+                    "syncToken": "sync",
+                    "prefToken": "pref",
+                }
+            ).encode("utf-8")
+        return self._contacts_body
+
+    def calendar_events(self):
+        return {
+            "Event": [
+                {
+                    "guid": "event-%d" % index,
+                    "pGuid": "home",
+                    "title": "Event %d" % index,
+                    "startDate": [20200101, 2020, 1, 1, 9, 0, 540],
+                    "endDate": [20200101, 2020, 1, 1, 10, 0, 600],
+                }
+                for index in range(self.events)
+            ]
+        }
+
+    def reminders_startup(self):
+        return {
+            "Collections": [{"title": "Reminders", "guid": "tasks", "ctag": "1"}],
+            "Reminders": [
+                {
+                    "title": "Reminder %d" % index,
+                    "pGuid": "tasks",
+                    "description": None,
+                    "dueDate": None,
+                }
+                for index in range(self.reminders)
+            ],
+        }
+
+
+class FakeICloudHandler(BaseHTTPRequestHandler):
+    """Routes requests to the synthetic data of the server."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; don't let Nagle and delayed
+    # ACKs add 40ms to every keep-alive request.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self._dispatch()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self._dispatch()
+
+    def _send_json(self, payload, status=200, headers=None):
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload).encode("utf-8")
+        self._send(payload, "application/json", status, headers)
+
+    def _send(self, body, content_type, status=200, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        path = urlparse(self.path).path
+        data = self.server.data
+        base_url = self.server.base_url
+
+        if path.endswith("/appleauth/auth/signin"):
+            return self._send_json(
+                {"authType": "non-sa"},
+                headers={
+                    "X-Apple-Session-Token": "session-token",
+                    "X-Apple-ID-Session-Id": "session-id",
+                    "X-Apple-ID-Account-Country": "USA",
+                    "scnt": "scnt",
+                },
+            )
+        if path.endswith("/accountLogin") or path.endswith("/validate"):
+            return self._send_json(data.account_data(base_url))
+        if path.endswith("/fmipservice/client/web/refreshClient"):
+            query = json.loads(body or b"{}")
+            return self._send_json(data.find_my(query.get("clientContext")))
+        if path.startswith("/findme/fmipservice/client/web/"):
+            return self._send_json({"statusCode": "200"})
+
+        if path.endswith("/records/query") and path.startswith("/ckdatabasews"):
+            query = json.loads(body or b"{}")
+            record_type = query["query"]["recordType"]
+            if record_type == "CheckIndexingState":
+                return self._send_json(
+                    {"records": [{"fields": {"state": {"value": "FINISHED"}}}]}
+                )
+            if record_type == "CPLAlbumByPositionLive":
+                return self._send_json({"records": []})
+            filters = {
+                item["fieldName"]: item["fieldValue"]["value"]
+                for item in query["query"]["filterBy"]
+            }
+            return self._send_json(
+                {
+                    "records": data.photo_records(
+                        filters["startRank"],
+                        query["resultsLimit"] // 2,
+                        filters.get("direction", "ASCENDING"),
+                    )
+                }
+            )
+        if path.endswith("/records/query/batch"):
+            count = {"fields": {"itemCount": {"value": data.photos}}}
+            return self._send_json({"batch": [{"records": [count]}]})
+
+        if path == "/drivews/retrieveItemDetailsInFolders":
+            return self._send_json(
+                [
+                    data.drive_node(item["drivewsid"].split("::")[-1])
+                    for item in json.loads(body)
+                ]
+            )
+        if path == "/drivews/retrieveAppLibraries":
+            return self._send_json({"items": []})
+        if path == "/docws/ws/com.apple.CloudDocs/download/by_id":
+            return self._send_json(
+                {"data_token": {"url": "%s/content/file" % base_url}}
+            )
+        if path.startswith("/content/"):
+            return self._send(b"x" * 1024, "application/octet-stream")
+
+        if path == "/contacts/co/startup":
+            return self._send_json({"prefToken": "pref", "syncToken": "sync"})
+        if path == "/contacts/co/contacts":
+            return self._send_json(data.contacts_body())
+
+        if path == "/calendar/ca/events":
+            return self._send_json(data.calendar_events())
+        if path == "/calendar/ca/startup":
+            return self._send_json(
+                {"Collection": [{"guid": "home", "title": "Home"}]}
+            )
+
+        if path == "/reminders/rd/startup":
+            return self._send_json(data.reminders_startup())
+
+        self._send_json({"error": "Not found: %s" % path}, status=404)
+
+
+class FakeICloudServer(ThreadingHTTPServer):
+    """Threaded local HTTP server answering like iCloud."""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, **scale):
+        ThreadingHTTPServer.__init__(self, (host, port), FakeICloudHandler)
+        self.data = FakeICloudData(**scale)
+        self.base_url = "http://%s:%d" % self.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        """Serves requests on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving and closes the socket."""
+        self.shutdown()
+        self.server_close()
+
+    def service_class(self, base=PyiCloudService):
+        """Returns a PyiCloudService subclass talking to this server."""
+        return service_class(self.base_url, base)
+
+
+class FakeICloudProcess(object):
+    """A `FakeICloudServer` running in a child process."""
+
+    def __init__(self, **scale):
+        command = [sys.executable, os.path.abspath(__file__), "--port", "0"]
+        for name, value in sorted(scale.items()):
+            command += ["--%s" % name.replace("_", "-"), str(value)]
+        self.process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, universal_newlines=True
+        )
+        line = self.process.stdout.readline()
+        if not line:
+            self.process.wait()
+            raise RuntimeError("Fake iCloud server failed to start")
+        self.base_url = line.split()[-1]
+
+    def start(self):
+        """Does nothing, the server serves as soon as it's built."""
+        return self
+
+    def stop(self):
+        """Stops the child process."""
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+    def service_class(self, base=PyiCloudService):
+        """Returns a PyiCloudService subclass talking to this server."""
+        return service_class(self.base_url, base)
+
+
+def service_class(base_url, base=PyiCloudService):
+    """Returns a PyiCloudService subclass talking to a fake server."""
+    return type(
+        "Fake%s" % base.__name__,
+        (base,),
+        {
+            "AUTH_ENDPOINT": "%s/idmsa/appleauth/auth" % base_url,
+            "HOME_ENDPOINT": base_url,
+            "SETUP_ENDPOINT": "%s/setup/setup/ws/1" % base_url,
+        },
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8123)
+    for name in (
+        "photos",
+        "contacts",
+        "devices",
+        "drive-depth",
+        "drive-fanout",
+        "drive-files",
+        "events",
+        "reminders",
+    ):
+        parser.add_argument("--%s" % name, type=int, default=argparse.SUPPRESS)
+    scale = vars(parser.parse_args())
+    server = FakeICloudServer(scale.pop("host"), scale.pop("port"), **scale)
+    print("Serving fake iCloud on %s" % server.base_url)
+    sys.stdout.flush()
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
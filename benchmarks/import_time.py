@@ -0,0 +1,93 @@
+"""Cold start benchmark: import time of pyicloud and of the app entry point.
+
+Every sample runs in a fresh interpreter, with ``-X importtime`` to find the
+slowest modules. ``main`` imports the GUI, so it needs wxPython installed and
+is skipped otherwise.
+
+Usage:
+    python benchmarks/import_time.py [runs] [--top N]
+"""
+from __future__ import print_function
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+TARGETS = [
+    ("pyicloud", "import pyicloud"),
+    ("PyiCloudService", "from pyicloud import PyiCloudService"),
+    ("services", "import pyicloud.services.findmyiphone, pyicloud.services.photos"),
+    ("main", "import main"),
+]
+
+
+def run(code):
+    """Runs `code` in a fresh interpreter; returns (seconds, importtime lines)."""
+    started = time.time()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SRC,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    elapsed = time.time() - started
+    if process.returncode:
+        return None, process.stderr.strip().splitlines()[-1:]
+    return elapsed, process.stderr.splitlines()
+
+
+def slowest_modules(lines, count):
+    """Returns the modules with the highest self import time, in µs."""
+    modules = []
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        modules.append((int(self_us), name.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("runs", type=int, nargs="?", default=5)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    print("%-18s %10s %10s %10s" % ("target", "min ms", "median ms", "max ms"))
+    details = []
+    for name, code in TARGETS:
+        timings = []
+        lines = []
+        for _ in range(args.runs):
+            elapsed, lines = run(code)
+            if elapsed is None:
+                break
+            timings.append(elapsed)
+        if not timings:
+            print("%-18s skipped: %s" % (name, " ".join(lines)))
+            continue
+        timings.sort()
+        print(
+            "%-18s %10.1f %10.1f %10.1f"
+            % (
+                name,
+                timings[0] * 1000,
+                timings[len(timings) // 2] * 1000,
+                timings[-1] * 1000,
+            )
+        )
+        details.append((name, slowest_modules(lines, args.top)))
+
+    for name, modules in details:
+        print()
+        print("slowest imports for %s:" % name)
+        for self_us, module in modules:
+            print("  %8.1f ms  %s" % (self_us / 1000.0, module))
+
+
+if __name__ == "__main__":
+    main()
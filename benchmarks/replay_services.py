@@ -0,0 +1,113 @@
+"""Repeatable service benchmarks over a recorded cassette.
+
+Record once against iCloud (needs network and a real account):
+    python benchmarks/replay_services.py icloud.json --username me@icloud.com --record
+
+Then replay as often as needed, without network:
+    python benchmarks/replay_services.py icloud.json --username me@icloud.com
+
+Every run uses a fresh cookie directory, so the same authentication flow
+is recorded and replayed.
+"""
+from __future__ import print_function
+import argparse
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pyicloud import PyiCloudService  # noqa: E402
+from pyicloud.cassette import CassetteAdapter  # noqa: E402
+
+
+def login(args, transport, cookie_directory):
+    """Authenticates through the cassette."""
+    return PyiCloudService(
+        args.username,
+        args.password or "replayed-password",
+        cookie_directory=cookie_directory,
+        transport=transport,
+        session_save_delay=0,
+    )
+
+
+def find_my_refresh(api, args):
+    """Runs one Find My refreshClient."""
+    api.devices.refresh_client()
+
+
+def photos_paging(api, args):
+    """Pages through the first photos of "All Photos"."""
+    for _ in itertools.islice(api.photos.all.photos, args.photos):
+        pass
+
+
+def drive_listing(api, args):
+    """Lists the iCloud Drive root and its first folder."""
+    root = api.drive.root
+    for child in root.get_children():
+        if child.type == "folder":
+            child.get_children()
+            break
+
+
+OPERATIONS = [find_my_refresh, photos_paging, drive_listing]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cassette")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--record", action="store_true", default=False)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--recorded-latency", action="store_true", default=False)
+    parser.add_argument("--photos", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = 1 if args.record else args.repeat
+    timings = {}
+    for _ in range(runs):
+        transport = CassetteAdapter(
+            args.cassette,
+            "record" if args.record else "replay",
+            latency=args.latency,
+            recorded_latency=args.recorded_latency,
+        )
+        cookie_directory = tempfile.mkdtemp()
+        try:
+            started = time.time()
+            api = login(args, transport, cookie_directory)
+            timings.setdefault("login", []).append(time.time() - started)
+            for operation in OPERATIONS:
+                started = time.time()
+                operation(api, args)
+                timings.setdefault(operation.__name__, []).append(
+                    time.time() - started
+                )
+            api.session.close()
+        finally:
+            shutil.rmtree(cookie_directory, ignore_errors=True)
+
+    print("%-20s %10s %10s %10s" % ("operation", "min ms", "mean ms", "max ms"))
+    for name, values in timings.items():
+        print(
+            "%-20s %10.1f %10.1f %10.1f"
+            % (
+                name,
+                min(values) * 1000,
+                sum(values) / len(values) * 1000,
+                max(values) * 1000,
+            )
+        )
+    print()
+    print(api.session.metrics.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Micro-benchmarks for the per-request logging work in PyiCloudSession.
+
+Compares the old ``inspect.stack()`` based lookup with the cached caller tag
+lookup used by ``PyiCloudSession.request``, and the old eager response
+logging with the lazy, truncated `LogPayload`. No network access is needed.
+
+Usage:
+    python benchmarks/request_overhead.py [iterations]
+"""
+from __future__ import print_function
+import inspect
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pyicloud.base import (  # noqa: E402
+    LogPayload,
+    PyiCloudPasswordFilter,
+    PyiCloudSession,
+)
+
+# A CloudKit page sized response body
+PAGE = {
+    "records": [
+        {"recordName": "record-%d" % index, "fields": {"value": {"value": index}}}
+        for index in range(200)
+    ]
+}
+
+
+class _OldPasswordFilter(logging.Filter):
+    """The password filter as it was, formatting every message."""
+
+    def filter(self, record):
+        message = record.getMessage()
+        if self.name in message:
+            record.msg = message.replace(self.name, "*" * 8)
+            record.args = []
+        return True
+
+
+class _Service(object):
+    password_filter = PyiCloudPasswordFilter("password")
+
+
+def old_attribution():
+    """Logger selection as done before, via inspect.stack()."""
+    callee = inspect.stack()[2]
+    module = inspect.getmodule(callee[0])
+    request_logger = logging.getLogger(module.__name__).getChild("http")
+    if _Service.password_filter not in request_logger.filters:
+        request_logger.addFilter(_Service.password_filter)
+    return request_logger
+
+
+def new_attribution(session):
+    """Logger selection as done by PyiCloudSession.request."""
+    caller = sys._getframe(2).f_globals.get(  # pylint: disable=protected-access
+        "__name__", __name__
+    )
+    return session._get_request_logger(caller)  # pylint: disable=protected-access
+
+
+def _post(func, *args):
+    # Stand-in for Session.post, so the attribution looks two frames up
+    return func(*args)
+
+
+def _service_call(func, *args):
+    # Stand-in for a service method calling session.post
+    return _post(func, *args)
+
+
+def _logger(name, password_filter, level):
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(level)
+    logger.addHandler(logging.NullHandler())
+    logger.addFilter(password_filter)
+    return logger
+
+
+def logging_overhead(iterations):
+    """Times logging a response page, DEBUG on and off."""
+    for level in (logging.INFO, logging.DEBUG):
+        old_logger = _logger(
+            "bench.old.%d" % level, _OldPasswordFilter("password"), level
+        )
+        new_logger = _logger(
+            "bench.new.%d" % level, PyiCloudPasswordFilter("password"), level
+        )
+
+        def new_log():
+            if new_logger.isEnabledFor(logging.DEBUG):
+                new_logger.debug("%s", LogPayload(PAGE))
+
+        old = timeit.timeit(lambda: old_logger.debug(PAGE), number=iterations)
+        new = timeit.timeit(new_log, number=iterations)
+        print("%s:" % logging.getLevelName(level))
+        print("  eager + filter:  %8.2f us/response" % (old / iterations * 1e6))
+        print("  LogPayload:      %8.2f us/response" % (new / iterations * 1e6))
+
+
+def main(iterations=2000):
+    session = PyiCloudSession(_Service())
+    old = timeit.timeit(lambda: _service_call(old_attribution), number=iterations)
+    new = timeit.timeit(
+        lambda: _service_call(new_attribution, session), number=iterations
+    )
+    print("iterations: %d" % iterations)
+    print("inspect.stack(): %8.2f us/request" % (old / iterations * 1e6))
+    print("caller tag:      %8.2f us/request" % (new / iterations * 1e6))
+    print("speedup:         %8.1fx" % (old / new))
+    print()
+    logging_overhead(iterations)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -1,3 +1,4 @@
+import atexit
 import sys
 import os
 import appdirs
@@ -23,6 +24,7 @@ def init():
 	args = sys.argv[1:]
 	if "--debug" in args:
 		debug = True
+		atexit.register(icloud.dump_stats)
 	icloud.load_pyicloud()
 	if not os.path.isdir(data_dir):
 		os.makedirs(data_dir)
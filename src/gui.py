@@ -3,7 +3,6 @@ import json
 import wx
 import pyperclip
 import tformat
-from pyicloud import *
 from pyicloud import exceptions as pyi_exceptions
 import app
 import config
@@ -62,28 +61,42 @@ class LoginDialog(wx.Dialog):
 			dialogs.error(self, "Error", "both an Apple ID and password must be supplied")
 			self.username.SetFocus()
 			return
-		# here we attempt authentication
+		# here we attempt authentication, in the background so the UI stays responsive
+		pyicloud = icloud.load_pyicloud().result()
+		# only published as icloud.service once logged in, so closing the dialog meanwhile doesn't open the main window
+		service = pyicloud.PyiCloudService(username, password, cookie_directory=app.data_dir, defer_auth=True)
+		self.login_btn.Disable()
+		future = service.login_async()
+		future.add_done_callback(lambda future: wx.CallAfter(self.on_login_done, future, service, username))
+
+	def on_login_done(self, future, service, username):
+		if not self:
+			# the dialog was closed while logging in
+			return
+		self.login_btn.Enable()
 		try:
-			icloud.service = PyiCloudService(username, password, cookie_directory=app.data_dir)
+			future.result()
 		except pyi_exceptions.PyiCloudException as exc:
 			dialogs.error(self, "Login failed", str(exc))
+			return
 		if self.remember_me.IsChecked():
 			config.config["email"] = username
 			config.config.write()
-		if icloud.service.requires_2fa:
+		if service.requires_2fa:
 			dlg = wx.TextEntryDialog(self, caption="Two-factor authentication required", message="Enter the code you received from an approved device")
 			res = dlg.ShowModal()
 			if res == wx.ID_OK:
-				res = icloud.service.validate_2fa_code(dlg.GetValue())
+				res = service.validate_2fa_code(dlg.GetValue())
 				if not res:
 					dialogs.error(self, "Error validating code", "Please try again, making sure to enter the correct security code")
 					return
-				if not icloud.service.is_trusted_session and self.remember_me.IsChecked():
-					res = icloud.service.trust_session()
+				if not service.is_trusted_session and self.remember_me.IsChecked():
+					res = service.trust_session()
 					if not res:
 						dialog.warning(self, "Warning", "There was an error obtaining a trusted session. This unfortunately means you may have to reauthenticate next time")
-		elif icloud.service.requires_2sa:
+		elif service.requires_2sa:
 			pass  # implement this later
+		icloud.service = service
 		self.Close()
 
 class MainFrame(wx.Frame):
@@ -171,7 +184,10 @@ class FindMy(wx.Panel):
 			idx = self.device_list.GetSelection()
 			if idx == wx.NOT_FOUND:
 				return
-			location = icloud.service.devices[idx].get("location")
+			# the device list is a snapshot, ask for the current position
+			device = icloud.service.devices[idx]
+			device.refresh()
+			location = device.get("location")
 			if not location:
 				dialogs.error(self, "Error", "This device has no associated location information")
 				return
@@ -195,8 +211,8 @@ class FindMy(wx.Panel):
 		def _inner():
 			items = []
 			try:
-				devices = icloud.service.devices
-			except PyiCloudNoDevicesException:
+				devices = icloud.service.refresh("devices")
+			except pyi_exceptions.PyiCloudNoDevicesException:
 				pass  # nothing to do
 			else:
 				for device in devices:
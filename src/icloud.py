@@ -3,15 +3,33 @@ Convenience functions for dealing with pyiCloud and the iCloud web API
 """
 
 import sys
-from utils import run_threaded
+from concurrent.futures import ThreadPoolExecutor
 
 
-# loading this module is slow, so we confine it's import to a separate thread as to not slow down launch of the application too much
-# assuming that it'll be ready in time for when we need to authenticate
+# loading pyicloud (mostly requests) is slow, so it's imported on a background thread while the UI starts up
+# load_pyicloud() returns a future resolved with the module once it can be used; .result() waits for it if needed
 pyicloud = None
-@run_threaded
+ready = None
+
 def load_pyicloud():
+	"""start importing pyicloud in the background, returning the readiness future"""
+	global ready
+	if ready is None:
+		executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyicloud-import")
+		ready = executor.submit(_import_pyicloud)
+		executor.shutdown(wait=False)
+	return ready
+
+def _import_pyicloud():
 	global pyicloud
-	import pyicloud
+	import pyicloud as module
+	module.PyiCloudService  # pulls in requests and the base module
+	pyicloud = module
+	return module
 
 service = None
+
+def dump_stats():
+	"""print per-endpoint HTTP statistics of the current session, if any"""
+	if service is not None:
+		print(service.session.metrics.format(), file=sys.stderr)
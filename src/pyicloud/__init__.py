@@ -1,5 +1,15 @@
 """The pyiCloud library."""
+import importlib
 import logging
-from pyicloud.base import PyiCloudService
+
+__all__ = ["PyiCloudService"]
 
 logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+
+def __getattr__(name):
+    # Importing the package stays cheap; `requests` and the service
+    # modules load with the first use of PyiCloudService.
+    if name == "PyiCloudService":
+        return importlib.import_module("pyicloud.base").PyiCloudService
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
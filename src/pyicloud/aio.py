@@ -0,0 +1,216 @@
+"""Asyncio interface to the iCloud services.
+
+The services keep talking HTTP through the blocking ``PyiCloudSession``;
+this module runs those calls on a shared, bounded thread pool so many of
+them can be awaited concurrently from a single event loop. The transport
+stays pluggable the same way as for the blocking API: mount a custom
+``requests`` adapter on ``service.session``, or subclass ``PyiCloudService``
+with other endpoints to talk to a local stand-in server.
+
+Concurrency is bounded by the executor's `max_workers` threads (32 by
+default) and by the connections kept per host. `create` sizes the
+connection pools to `max_workers`; raise it, e.g. to 200, for hundreds of
+requests in flight.
+
+Usage:
+    from pyicloud.aio import AsyncPyiCloudService
+
+    api = await AsyncPyiCloudService.create('username@apple.com', 'password')
+    devices = await api.devices()
+    async for device in devices:
+        ...
+    photos = await api.photos()
+    async for photo in api.photos_of(await photos.get("all")):
+        ...
+"""
+import asyncio
+import functools
+import operator
+from concurrent.futures import ThreadPoolExecutor
+
+from pyicloud.base import PyiCloudService
+
+
+def _take(iterator, count):
+    """Returns up to `count` items from an iterator."""
+    items = []
+    for item in iterator:
+        items.append(item)
+        if len(items) >= count:
+            break
+    return items
+
+
+class AsyncServiceProxy(object):
+    """Awaitable wrapper around a service object.
+
+    Methods of the wrapped service return coroutines. Properties of the
+    service class may hit the network, so they must be read with `get`
+    rather than on the event loop. Likewise, items are read with `item`,
+    the length with `length`, and the service iterated with ``async for``.
+    """
+
+    def __init__(self, api, service):
+        self._api = api
+        self._service = service
+
+    @property
+    def service(self):
+        """Gets the wrapped service."""
+        return self._service
+
+    async def get(self, attr):
+        """Reads an attribute of the wrapped service off the event loop."""
+        return await self._api.run(getattr, self._service, attr)
+
+    async def item(self, key):
+        """Returns ``service[key]``, read off the event loop."""
+        return await self._api.run(operator.getitem, self._service, key)
+
+    async def length(self):
+        """Returns ``len(service)``, computed off the event loop."""
+        return await self._api.run(len, self._service)
+
+    def __aiter__(self):
+        return self._api.iterate(self._service).__aiter__()
+
+    def __getattr__(self, attr):
+        method = getattr(type(self._service), attr, None)
+        if isinstance(method, property):
+            raise AttributeError(
+                "%r may block the event loop, read it with await proxy.get(%r)"
+                % (attr, attr)
+            )
+        if not callable(method):
+            return getattr(self._service, attr)
+
+        bound = getattr(self._service, attr)
+
+        @functools.wraps(bound)
+        async def call(*args, **kwargs):
+            return await self._api.run(bound, *args, **kwargs)
+
+        return call
+
+    def __repr__(self):
+        return "<%s: %r>" % (type(self).__name__, self._service)
+
+
+class AsyncPyiCloudService(object):
+    """Asyncio wrapper around a `PyiCloudService`."""
+
+    def __init__(self, service, executor=None, max_workers=32):
+        self.service = service
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pyicloud"
+        )
+
+    @classmethod
+    async def create(
+        cls, *args, executor=None, max_workers=32, service_class=None, **kwargs
+    ):
+        """Builds and authenticates a service without blocking the loop.
+
+        Arguments are passed to `PyiCloudService` (or `service_class`).
+        Unless a `transport` or `pool_config` is given, each host keeps up
+        to `max_workers` connections, so every worker can have one.
+        """
+        service_class = service_class or PyiCloudService
+        if "transport" not in kwargs:
+            kwargs.setdefault(
+                "pool_config", {"default": {"pool_maxsize": max_workers}}
+            )
+        own_executor = executor is None
+        if own_executor:
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="pyicloud"
+            )
+        loop = asyncio.get_event_loop()
+        service = await loop.run_in_executor(
+            executor, functools.partial(service_class, *args, **kwargs)
+        )
+        api = cls(service, executor=executor)
+        api._own_executor = own_executor  # pylint: disable=protected-access
+        return api
+
+    async def run(self, func, *args, **kwargs):
+        """Runs a blocking callable on the executor and awaits its result."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def iterate(self, iterable, chunk_size=100):
+        """Asynchronously iterates a blocking iterable, such as an album.
+
+        Items are pulled `chunk_size` at a time so paged services like
+        `PhotoAlbum.photos` cost one executor hop per page.
+        """
+        iterator = await self.run(iter, iterable)
+        while True:
+            items = await self.run(_take, iterator, chunk_size)
+            for item in items:
+                yield item
+            if len(items) < chunk_size:
+                break
+
+    async def authenticate(self, force_refresh=False, service=None):
+        """Authenticates, see `PyiCloudService.authenticate`."""
+        return await self.run(self.service.authenticate, force_refresh, service)
+
+    async def validate_2fa_code(self, code):
+        """Verifies a 2FA code, see `PyiCloudService.validate_2fa_code`."""
+        return await self.run(self.service.validate_2fa_code, code)
+
+    async def trust_session(self):
+        """Requests session trust, see `PyiCloudService.trust_session`."""
+        return await self.run(self.service.trust_session)
+
+    async def _service(self, name):
+        return AsyncServiceProxy(self, await self.run(getattr, self.service, name))
+
+    async def devices(self):
+        """Gets the 'Find my iPhone' service."""
+        return await self._service("devices")
+
+    async def account(self):
+        """Gets the 'Account' service."""
+        return await self._service("account")
+
+    async def files(self):
+        """Gets the 'File' service."""
+        return await self._service("files")
+
+    async def photos(self):
+        """Gets the 'Photo' service."""
+        return await self._service("photos")
+
+    async def calendar(self):
+        """Gets the 'Calendar' service."""
+        return await self._service("calendar")
+
+    async def contacts(self):
+        """Gets the 'Contacts' service."""
+        return await self._service("contacts")
+
+    async def reminders(self):
+        """Gets the 'Reminders' service."""
+        return await self._service("reminders")
+
+    async def drive(self):
+        """Gets the 'Drive' service."""
+        return await self._service("drive")
+
+    async def photos_of(self, album, chunk_size=100):
+        """Asynchronously iterates the photos of a `PhotoAlbum`."""
+        async for photo in self.iterate(album.photos, chunk_size):
+            yield photo
+
+    def close(self):
+        """Shuts down the executor, if it was created here."""
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    def __repr__(self):
+        return "<%s: %s>" % (type(self).__name__, self.service)
@@ -1,37 +1,83 @@
 """Library base file."""
 from six import PY2, string_types
 from uuid import uuid1
-import inspect
 import json
 import logging
-from requests import Session
+import reprlib
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from requests import Response, Session
+from requests.exceptions import ConnectionError, Timeout  # pylint: disable=redefined-builtin
+from requests.adapters import HTTPAdapter
+from six.moves.urllib.parse import urlparse
 from tempfile import gettempdir
 from os import path, mkdir
-from re import match
+import re
 import http.cookiejar as cookielib
 import getpass
 
 from pyicloud.exceptions import (
+    PyiCloudException,
     PyiCloudFailedLoginException,
     PyiCloudAPIResponseException,
     PyiCloud2SARequiredException,
     PyiCloudServiceNotActivatedException,
 )
-from pyicloud.services import (
-    FindMyiPhoneServiceManager,
-    CalendarService,
-    UbiquityService,
-    ContactsService,
-    RemindersService,
-    PhotosService,
-    AccountService,
-    DriveService,
+from pyicloud import services
+from pyicloud.metrics import (
+    MetricsCollector,
+    endpoint_name,
+    request_size,
+    response_size,
 )
+from pyicloud.cache import HTTPCache
+from pyicloud.keepalive import SessionKeepAlive
+from pyicloud.ratelimit import THROTTLE_CODES, RateLimiter
+from pyicloud.retry import NO_RETRY, RetryPolicy
+from pyicloud.store import FileSessionStore, SQLiteSessionStore
+from pyicloud.streaming import JSONArrayStream
 from pyicloud.utils import get_password_from_keyring
 
 
 LOGGER = logging.getLogger(__name__)
 
+NON_WORD_CHARS = re.compile(r"\W")
+
+JSON_MIMETYPES = ["application/json", "text/json"]
+
+# Marks a response whose JSON body hasn't been decoded yet
+NOT_DECODED = object()
+
+# Statuses that always mean "authenticate and try again", whatever the body
+AUTH_RETRY_STATUSES = [421, 450, 500]
+
+# HTTPAdapter arguments used for every host unless overridden in pool_config
+DEFAULT_POOL_CONFIG = {
+    "pool_connections": 10,
+    "pool_maxsize": 10,
+    "pool_block": False,
+}
+
+# Methods refreshing the data of memoized services, by service name
+SERVICE_REFRESH_METHODS = {
+    "devices": "refresh_client",
+    "account": "refresh",
+    "reminders": "refresh",
+}
+
+# Characters of request and response bodies kept in debug logs
+LOG_PAYLOAD_LIMIT = 2048
+
+_PAYLOAD_REPR = reprlib.Repr()
+_PAYLOAD_REPR.maxlevel = 4
+_PAYLOAD_REPR.maxdict = 20
+_PAYLOAD_REPR.maxlist = 20
+_PAYLOAD_REPR.maxstring = 200
+_PAYLOAD_REPR.maxother = 200
+
 HEADER_DATA = {
     "X-Apple-ID-Account-Country": "account_country",
     "X-Apple-ID-Session-Id": "session_id",
@@ -41,6 +87,55 @@ HEADER_DATA = {
 }
 
 
+class LogPayload(object):
+    """A request or response body in a log record.
+
+    It's only rendered when the record is emitted, cut to `limit`
+    characters, with the `secrets` added by password filters hidden.
+    """
+
+    __slots__ = ("payload", "limit", "secrets")
+
+    def __init__(self, payload, limit=LOG_PAYLOAD_LIMIT):
+        self.payload = payload
+        self.limit = limit
+        self.secrets = []
+
+    def __str__(self):
+        payload = self.payload
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8", "replace")
+        if isinstance(payload, string_types):
+            text = payload
+        else:
+            # Bounded, unlike str() of a whole CloudKit page
+            text = _PAYLOAD_REPR.repr(payload)
+        for secret in self.secrets:
+            if secret in text:
+                text = text.replace(secret, "*" * 8)
+        if self.limit and len(text) > self.limit:
+            text = "%s... (%d chars)" % (text[: self.limit], len(text))
+        return text
+
+
+def _get_error(data):
+    """Returns the ``(reason, code)`` of an error body; reason is None if OK."""
+    if not isinstance(data, dict):
+        return None, None
+    reason = data.get("errorMessage")
+    reason = reason or data.get("reason")
+    reason = reason or data.get("errorReason")
+    if not reason and isinstance(data.get("error"), string_types):
+        reason = data.get("error")
+    if not reason and data.get("error"):
+        reason = "Unknown reason"
+
+    code = data.get("errorCode")
+    if not code and data.get("serverErrorCode"):
+        code = data.get("serverErrorCode")
+    return reason, code
+
+
 class PyiCloudPasswordFilter(logging.Filter):
     """Password log hider."""
 
@@ -48,6 +143,32 @@ class PyiCloudPasswordFilter(logging.Filter):
         super(PyiCloudPasswordFilter, self).__init__(password)
 
     def filter(self, record):
+        if not self.name:
+            return True
+        args = record.args
+        if (
+            isinstance(record.msg, string_types)
+            and isinstance(args, tuple)
+            and all(
+                isinstance(arg, (LogPayload, string_types, int, float, type(None)))
+                for arg in args
+            )
+        ):
+            # Check the pieces: payloads redact themselves when rendered,
+            # so nothing gets formatted here.
+            redacted = []
+            for arg in args:
+                if isinstance(arg, LogPayload):
+                    if self.name not in arg.secrets:
+                        arg.secrets.append(self.name)
+                elif isinstance(arg, string_types) and self.name in arg:
+                    arg = arg.replace(self.name, "*" * 8)
+                redacted.append(arg)
+            record.args = tuple(redacted)
+            if self.name in record.msg:
+                record.msg = record.msg.replace(self.name, "*" * 8)
+            return True
+
         message = record.getMessage()
         if self.name in message:
             record.msg = message.replace(self.name, "*" * 8)
@@ -56,112 +177,523 @@ class PyiCloudPasswordFilter(logging.Filter):
         return True
 
 
+class PyiCloudResponse(Response):
+    """Response decoding its JSON body only once.
+
+    The session checks every JSON response for errors, and services then
+    read the same body again; both get the same decoded object.
+    """
+
+    _json = NOT_DECODED
+
+    def json(self, **kwargs):
+        if kwargs:
+            return super(PyiCloudResponse, self).json(**kwargs)
+        if self._json is NOT_DECODED:
+            self._json = super(PyiCloudResponse, self).json()
+        return self._json
+
+
+class _Flight(object):
+    """An in-flight request, awaited by its duplicates."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
 class PyiCloudSession(Session):
     """iCloud session."""
 
-    def __init__(self, service):
+    def __init__(
+        self,
+        service,
+        pool_config=None,
+        retry_policy=None,
+        transport=None,
+        rate_limiter=None,
+        http_cache=None,
+    ):  # pylint: disable=too-many-arguments
         self.service = service
+        self._request_loggers = {}
         Session.__init__(self)
 
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_stats = Counter()
+        self._lock = threading.Lock()
+        self.metrics = MetricsCollector()
+        self.last_request_at = 0.0
+        # Characters of bodies kept in debug logs, 0 for no limit
+        self.log_payload_limit = LOG_PAYLOAD_LIMIT
+        self.rate_limiter = rate_limiter
+        self.http_cache = http_cache
+        # Concurrent identical idempotent requests share one HTTP call
+        self.single_flight = True
+        self._in_flight = {}
+
+        # pool_config maps webservice keys (and "default") to HTTPAdapter
+        # arguments: pool_connections, pool_maxsize and pool_block.
+        self.pool_config = pool_config or {}
+        self._mounted_hosts = {}
+        self._webservice_roots = []
+        # A custom transport adapter (e.g. a CassetteAdapter) handles every
+        # request, so no per-host pools are mounted over it.
+        self.transport = transport
+        default_adapter = transport or HTTPAdapter(**self._get_pool_config("default"))
+        self.mount("https://", default_adapter)
+        self.mount("http://", default_adapter)
+
+    def _get_pool_config(self, ws_key):
+        config = dict(DEFAULT_POOL_CONFIG)
+        config.update(self.pool_config.get("default", {}))
+        config.update(self.pool_config.get(ws_key, {}))
+        return config
+
+    def mount_webservices(self, webservices):
+        """Mounts a dedicated connection pool for each webservice host."""
+        roots = []
+        for ws_key, webservice in webservices.items():
+            url = webservice.get("url")
+            if not url:
+                continue
+            roots.append((url.lower().rstrip("/") + "/", ws_key))
+            parts = urlparse(url)
+            prefix = "%s://%s/" % (parts.scheme, parts.netloc.lower())
+            config = self._get_pool_config(ws_key)
+            if prefix in self._mounted_hosts:
+                # Hosts shared by several webservices keep their first pool
+                continue
+            self._mounted_hosts[prefix] = ws_key
+            if self.transport is not None:
+                continue
+            self.mount(prefix, HTTPAdapter(**config))
+            LOGGER.debug("Mounted %s pool for %s: %s", ws_key, prefix, config)
+
+        # Longest roots first, for webservices sharing a host
+        roots.sort(key=lambda root: len(root[0]), reverse=True)
+        self._webservice_roots = roots
+
+    def _get_webservice_key(self, url):
+        """Returns the key of the webservice a URL belongs to, if any."""
+        url = url.lower()
+        for root, ws_key in self._webservice_roots:
+            if url.startswith(root):
+                return ws_key
+        return None
+
+    def pool_stats(self):
+        """Returns connection pool usage per host.
+
+        ``requests`` counts requests sent through the pool, ``new_connections``
+        the connections it had to open and ``reused_connections`` the
+        requests served by a kept-alive connection.
+        """
+        stats = {}
+        adapters = []
+        for adapter in self.adapters.values():
+            if adapter not in adapters:
+                adapters.append(adapter)
+        for adapter in adapters:
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                host = "%s://%s:%s" % (pool.scheme, pool.host, pool.port)
+                host_stats = stats.setdefault(
+                    host,
+                    {
+                        "webservice": self._mounted_hosts.get(
+                            "%s/" % host,
+                            self._mounted_hosts.get(
+                                "%s://%s/" % (pool.scheme, pool.host)
+                            ),
+                        ),
+                        "requests": 0,
+                        "new_connections": 0,
+                        "reused_connections": 0,
+                        "maxsize": 0,
+                    },
+                )
+                host_stats["requests"] += pool.num_requests
+                host_stats["new_connections"] += pool.num_connections
+                host_stats["reused_connections"] += max(
+                    pool.num_requests - pool.num_connections, 0
+                )
+                if pool.pool is not None:
+                    host_stats["maxsize"] += pool.pool.maxsize
+        return stats
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        ws_key = self._get_webservice_key(request.url)
+        cache = self.http_cache
+        key = entry = None
+        if cache is not None and ws_key is not None:
+            # Authentication endpoints are never cached
+            if request.method == "GET" and not kwargs.get("stream"):
+                key = cache.key(self.service.user["accountName"], ws_key, request.url)
+                entry, fresh = cache.lookup(key)
+                if fresh:
+                    return cache.build_response(entry, request)
+                if entry is not None:
+                    request.headers.update(cache.conditional_headers(entry))
+            elif request.method not in ("HEAD", "OPTIONS"):
+                # Writes may change anything the webservice returns
+                cache.invalidate(ws_key)
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(ws_key)
+        response = super(PyiCloudSession, self).send(request, **kwargs)
+
+        if key is not None:
+            if entry is not None and response.status_code == 304:
+                entry = cache.refresh(key, ws_key, entry, response)
+                response.close()
+                return cache.build_response(entry, request)
+            if response.status_code == 200:
+                cache.store(key, ws_key, response)
+        return response
+
+    def _count(self, key):
+        with self._lock:
+            self.retry_stats[key] += 1
+
+    def _get_request_logger(self, caller):
+        """Returns the (cached) HTTP logger for a caller tag."""
+        request_logger = self._request_loggers.get(caller)
+        if request_logger is None:
+            with self._lock:
+                request_logger = logging.getLogger(caller).getChild("http")
+                if self.service.password_filter not in request_logger.filters:
+                    request_logger.addFilter(self.service.password_filter)
+                self._request_loggers[caller] = request_logger
+        return request_logger
+
     def request(self, method, url, **kwargs):  # pylint: disable=arguments-differ
 
-        # Charge logging to the right service endpoint
-        callee = inspect.stack()[2]
-        module = inspect.getmodule(callee[0])
-        request_logger = logging.getLogger(module.__name__).getChild("http")
-        if self.service.password_filter not in request_logger.filters:
-            request_logger.addFilter(self.service.password_filter)
+        # Charge logging to the right service endpoint. Callers may pass an
+        # explicit tag, otherwise use the module two frames up (the service
+        # calling get/post), which is a constant time lookup.
+        caller = kwargs.pop("caller", None)
+        if caller is None:
+            caller = sys._getframe(2).f_globals.get(  # pylint: disable=protected-access
+                "__name__", __name__
+            )
+        request_logger = self._get_request_logger(caller)
 
-        request_logger.debug(
-            "%s %s %s" % (
+        if request_logger.isEnabledFor(logging.DEBUG):
+            request_logger.debug(
+                "%s %s %s",
                 method,
                 url,
-                kwargs.get("data", "")
+                LogPayload(kwargs.get("data", ""), self.log_payload_limit),
             )
-        )
 
-        has_retried = kwargs.get("retried")
-        kwargs.pop("retried", None)
-        response = super(PyiCloudSession, self).request(method, url, **kwargs)
+        idempotent = kwargs.pop("idempotent", None)
+        if idempotent is None:
+            idempotent = self.retry_policy.is_idempotent(method)
+        if kwargs.pop("retried", None):
+            # Legacy flag: the caller already retried this request
+            retry_policy = NO_RETRY
+        else:
+            retry_policy = self.retry_policy
+
+        flight_key = None
+        if idempotent and self.single_flight:
+            flight_key = self._get_flight_key(method, url, kwargs)
+        if flight_key is None:
+            return self._request(
+                method, url, request_logger, idempotent, retry_policy, kwargs
+            )
 
-        content_type = response.headers.get("Content-Type", "").split(";")[0]
-        json_mimetypes = ["application/json", "text/json"]
+        with self._lock:
+            flight = self._in_flight.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[flight_key] = _Flight()
+        if not leader:
+            # The same request is already on its way, share its outcome
+            self._count("deduplicated")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
 
-        for header in HEADER_DATA:
-            if response.headers.get(header):
-                session_arg = HEADER_DATA[header]
-                self.service.session_data.update(
-                    {session_arg: response.headers.get(header)}
+        try:
+            flight.response = self._request(
+                method, url, request_logger, idempotent, retry_policy, kwargs
+            )
+            return flight.response
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[flight_key]
+            flight.done.set()
+
+    @staticmethod
+    def _get_flight_key(method, url, kwargs):
+        """Returns what identifies identical requests, or None if unsure."""
+        if kwargs.get("stream") or kwargs.get("files"):
+            return None
+        try:
+            arguments = json.dumps(
+                [
+                    kwargs.get("params"),
+                    kwargs.get("data"),
+                    kwargs.get("json"),
+                    kwargs.get("headers"),
+                ],
+                sort_keys=True,
+                default=repr,
+            )
+        except (TypeError, ValueError):
+            return None
+        return (method.upper(), url, arguments)
+
+    def _request(
+        self, method, url, request_logger, idempotent, retry_policy, kwargs
+    ):  # pylint: disable=too-many-arguments
+        ws_key = self._get_webservice_key(url)
+        endpoint = endpoint_name(method, url, ws_key)
+
+        attempt = 0
+        reauthenticated = False
+        while True:
+            attempt += 1
+            auth_generation = self.service.auth_generation
+            started = time.time()
+            self.last_request_at = started
+            try:
+                response = super(PyiCloudSession, self).request(method, url, **kwargs)
+            except (ConnectionError, Timeout) as error:
+                self.metrics.record(endpoint, None, time.time() - started)
+                if not retry_policy.should_retry(attempt, idempotent):
+                    raise
+                self._wait_for_retry(
+                    retry_policy,
+                    attempt,
+                    None,
+                    request_logger,
+                    error,
+                    ws_key,
+                    endpoint,
                 )
+                continue
+            response.__class__ = PyiCloudResponse
+            self.metrics.record(
+                endpoint,
+                response.status_code,
+                time.time() - started,
+                request_size(response.request),
+                response_size(response, kwargs.get("stream", False)),
+            )
 
-        # Save session_data to file
-        with open(self.service.session_path, "w") as outfile:
-            json.dump(self.service.session_data, outfile)
-            LOGGER.debug("Saved session data to file")
+            content_type = response.headers.get("Content-Type", "").split(";")[0]
+
+            with self._lock:
+                # Cached responses carry the session headers of their time
+                if not getattr(response, "from_cache", False):
+                    for header in HEADER_DATA:
+                        if response.headers.get(header):
+                            session_arg = HEADER_DATA[header]
+                            self.service.session_data.update(
+                                {session_arg: response.headers.get(header)}
+                            )
+
+                # Persist session_data and cookies, if they changed
+                self.service.session_store.save(
+                    self.service.session_data, self.cookies
+                )
 
-        # Save cookies to file
-        self.cookies.save(ignore_discard=True, ignore_expires=True)
-        LOGGER.debug("Cookies saved to %s", self.service.cookiejar_path)
+            status_code = response.status_code
+            if not response.ok and (
+                content_type not in JSON_MIMETYPES
+                or status_code in AUTH_RETRY_STATUSES
+                or status_code in retry_policy.retry_statuses
+            ):
+                if (
+                    not reauthenticated
+                    and status_code == 450
+                    and self._is_findme_url(url)
+                ):
+                    # Handle re-authentication for Find My iPhone. Threads
+                    # failing together share a single re-authentication.
+                    LOGGER.debug("Re-authenticating Find My iPhone service")
+                    self.service.reauthenticate(auth_generation, "find")
+                    reauthenticated = True
+                    self._count("reauthentications")
+                    response.close()
+                    continue
+
+                if (
+                    not reauthenticated
+                    and status_code in AUTH_RETRY_STATUSES
+                    and self.service.unvalidated
+                ):
+                    # The session was reused without validation, check it now
+                    LOGGER.debug("Re-validating the session")
+                    self.service.revalidate(auth_generation)
+                    reauthenticated = True
+                    self._count("revalidations")
+                    response.close()
+                    continue
+
+                if retry_policy.should_retry(attempt, idempotent, status_code):
+                    api_error = PyiCloudAPIResponseException(
+                        response.reason, status_code, retry=True
+                    )
+                    self._wait_for_retry(
+                        retry_policy,
+                        attempt,
+                        response,
+                        request_logger,
+                        api_error,
+                        ws_key,
+                        endpoint,
+                    )
+                    response.close()
+                    continue
+
+                if attempt > 1:
+                    self._count("exhausted")
+                self._raise_error(status_code, response.reason)
+
+            if content_type not in JSON_MIMETYPES:
+                return response
+
+            if kwargs.get("stream") and response.ok:
+                # Left to the caller to decode incrementally, and to check
+                # for errors once it's done (see iter_json_array)
+                return response
 
-        if not response.ok and (content_type not in json_mimetypes
-                                or response.status_code in [421, 450, 500]):
             try:
-                fmip_url = self.service._get_webservice_url("findme")
-                if has_retried is None and response.status_code == 450 and fmip_url in url:
-                    # Handle re-authentication for Find My iPhone
-                    LOGGER.debug("Re-authenticating Find My iPhone service")
-                    try:
-                        self.service.authenticate(True, "find")
-                    except PyiCloudAPIResponseException:
-                        LOGGER.debug("Re-authentication failed")
-                    kwargs["retried"] = True
-                    return self.request(method, url, **kwargs)
-            except Exception:
-                pass
-
-            if has_retried is None and response.status_code in [421, 450, 500]:
-                api_error = PyiCloudAPIResponseException(
-                    response.reason, response.status_code, retry=True
-                )
-                request_logger.debug(api_error)
-                kwargs["retried"] = True
-                return self.request(method, url, **kwargs)
+                data = response.json()
+            except:  # pylint: disable=bare-except
+                request_logger.warning("Failed to parse response with JSON mimetype")
+                return response
 
-            self._raise_error(response.status_code, response.reason)
+            if request_logger.isEnabledFor(logging.DEBUG):
+                request_logger.debug("%s", LogPayload(data, self.log_payload_limit))
 
-        if content_type not in json_mimetypes:
-            return response
+            reason, code = _get_error(data)
+            if reason:
+                # Errors without a code aren't transient
+                if code is not None and retry_policy.should_retry(
+                    attempt, idempotent, error_code=code
+                ):
+                    api_error = PyiCloudAPIResponseException(reason, code, retry=True)
+                    self._wait_for_retry(
+                        retry_policy,
+                        attempt,
+                        response,
+                        request_logger,
+                        api_error,
+                        ws_key,
+                        endpoint,
+                    )
+                    continue
+                if attempt > 1:
+                    self._count("exhausted")
+                self._raise_error(code, reason)
 
-        try:
-            data = response.json()
-        except:  # pylint: disable=bare-except
-            request_logger.warning("Failed to parse response with JSON mimetype")
             return response
 
-        request_logger.debug(data)
-
-        if isinstance(data, dict):
-            reason = data.get("errorMessage")
-            reason = reason or data.get("reason")
-            reason = reason or data.get("errorReason")
-            if not reason and isinstance(data.get("error"), string_types):
-                reason = data.get("error")
-            if not reason and data.get("error"):
-                reason = "Unknown reason"
-
-            code = data.get("errorCode")
-            if not code and data.get("serverErrorCode"):
-                code = data.get("serverErrorCode")
-
-            if reason:
-                self._raise_error(code, reason)
+    def iter_json_array(self, method, url, key, **kwargs):
+        """Yields the items of array `key` of a JSON response as they arrive.
 
-        return response
+        The response is streamed and decoded with `JSONArrayStream`. Errors
+        in its body are only known once it's read: they are then raised, or
+        the request retried if nothing was yielded yet, like other requests.
+        The generator returns the other top-level members of the body.
+        """
+        if "caller" not in kwargs:
+            kwargs["caller"] = sys._getframe(  # pylint: disable=protected-access
+                1
+            ).f_globals.get("__name__", __name__)
+        return self._iter_json_array(method, url, key, kwargs)
+
+    def _iter_json_array(self, method, url, key, kwargs):
+        request_logger = self._get_request_logger(kwargs["caller"])
+        ws_key = self._get_webservice_key(url)
+        endpoint = endpoint_name(method, url, ws_key)
+        idempotent = kwargs.get("idempotent")
+        if idempotent is None:
+            idempotent = self.retry_policy.is_idempotent(method)
+        retry_policy = NO_RETRY if kwargs.get("retried") else self.retry_policy
+
+        attempt = 0
+        while True:
+            attempt += 1
+            response = self.request(method, url, stream=True, **kwargs)
+            stream = JSONArrayStream(response, key)
+            items = 0
+            for item in stream:
+                items += 1
+                yield item
+
+            reason, code = _get_error(stream.rest)
+            if not reason:
+                return stream.rest
+            if (
+                not items
+                and code is not None
+                and retry_policy.should_retry(attempt, idempotent, error_code=code)
+            ):
+                api_error = PyiCloudAPIResponseException(reason, code, retry=True)
+                self._wait_for_retry(
+                    retry_policy,
+                    attempt,
+                    response,
+                    request_logger,
+                    api_error,
+                    ws_key,
+                    endpoint,
+                )
+                continue
+            if attempt > 1:
+                self._count("exhausted")
+            self._raise_error(code, reason)
+
+    def _is_findme_url(self, url):
+        # Not through _get_webservice_url, which would authenticate first
+        webservices = getattr(self.service, "_webservices", None) or {}
+        findme_url = (webservices.get("findme") or {}).get("url")
+        return bool(findme_url) and findme_url in url
+
+    def _wait_for_retry(
+        self, retry_policy, attempt, response, request_logger, error, ws_key, endpoint
+    ):  # pylint: disable=too-many-arguments
+        delay = retry_policy.get_delay(attempt, response)
+        throttled = (
+            self.rate_limiter is not None
+            and getattr(error, "code", None) in THROTTLE_CODES
+            # Slow down every request to this webservice, not just this one;
+            # the rate limiter then makes the retry wait its turn.
+            and self.rate_limiter.pause(ws_key, delay)
+        )
+        if throttled and not self.rate_limiter.block:
+            # A non-blocking rate limiter would reject the retry, wait here
+            delay = max(delay, self.rate_limiter.delay(ws_key))
+            throttled = False
+        self.metrics.record_retry(endpoint)
+        self._count("retries")
+        if response is not None:
+            self._count("status_%s" % response.status_code)
+        else:
+            self._count("connection_errors")
+        request_logger.debug("%s (attempt %d, waiting %.2fs)", error, attempt, delay)
+        if delay > 0 and not throttled:
+            time.sleep(delay)
 
     def _raise_error(self, code, reason):
         if (
-            self.service.requires_2sa
-            and reason == "Missing X-APPLE-WEBAUTH-TOKEN cookie"
+            reason == "Missing X-APPLE-WEBAUTH-TOKEN cookie"
+            # Errors while logging in mustn't trigger another login
+            and self.service._authenticated  # pylint: disable=protected-access
+            and self.service.requires_2sa
         ):
             raise PyiCloud2SARequiredException(self.service.user["apple_id"])
         if code in ("ZONE_NOT_FOUND", "AUTHENTICATION_FAILED"):
@@ -209,6 +741,16 @@ class PyiCloudService(object):
         verify=True,
         client_id=None,
         with_family=True,
+        session_store=None,
+        session_save_delay=1.0,
+        session_database=None,
+        pool_config=None,
+        retry_policy=None,
+        transport=None,
+        rate_limits=None,
+        http_cache=None,
+        defer_auth=False,
+        validation_window=0,
     ):
         if password is None:
             password = get_password_from_keyring(apple_id)
@@ -222,6 +764,20 @@ class PyiCloudService(object):
         self.password_filter = PyiCloudPasswordFilter(password)
         LOGGER.addFilter(self.password_filter)
 
+        # Incremented on every authentication, so concurrent requests failing
+        # with the same stale session re-authenticate only once.
+        self.auth_generation = 0
+        self._auth_lock = threading.RLock()
+        self._authenticated = False
+        self._login_future = None
+        self._keepalive = None
+        # Seconds during which a validated session is reused as is
+        self.validation_window = validation_window
+        self.unvalidated = False
+        self._services = {}
+        self._service_locks = {}
+        self._services_lock = threading.Lock()
+
         if cookie_directory:
             self._cookie_directory = path.expanduser(path.normpath(cookie_directory))
             if not path.exists(self._cookie_directory):
@@ -234,51 +790,199 @@ class PyiCloudService(object):
             if not path.exists(self._cookie_directory):
                 mkdir(self._cookie_directory, 0o700)
 
-        LOGGER.debug("Using session file %s" % self.session_path)
+        LOGGER.debug("Using session file %s", self.session_path)
 
-        self.session_data = {}
-        try:
-            with open(self.session_path) as session_f:
-                self.session_data = json.load(session_f)
-        except:  # pylint: disable=bare-except
-            LOGGER.info("Session file does not exist")
+        if session_store is None and session_database:
+            session_store = SQLiteSessionStore(
+                path.join(self._cookie_directory, path.expanduser(session_database)),
+                apple_id,
+                delay=session_save_delay,
+            )
+        elif session_store is None:
+            session_store = FileSessionStore(
+                self.session_path, self.cookiejar_path, delay=session_save_delay
+            )
+        self.session_store = session_store
+        self.session_data = self.session_store.load_session_data()
         if self.session_data.get("client_id"):
             self.client_id = self.session_data.get("client_id")
         else:
             self.session_data.update({"client_id": self.client_id})
 
-        self.session = PyiCloudSession(self)
+        if rate_limits is not None and not isinstance(rate_limits, RateLimiter):
+            rate_limits = RateLimiter(rate_limits)
+        if http_cache is True:
+            http_cache = HTTPCache()
+        self.session = PyiCloudSession(
+            self, pool_config, retry_policy, transport, rate_limits, http_cache
+        )
         self.session.verify = verify
         self.session.headers.update(
             {"Origin": self.HOME_ENDPOINT, "Referer": "%s/" % self.HOME_ENDPOINT}
         )
 
-        cookiejar_path = self.cookiejar_path
-        self.session.cookies = cookielib.LWPCookieJar(filename=cookiejar_path)
-        if path.exists(cookiejar_path):
-            try:
-                self.session.cookies.load(ignore_discard=True, ignore_expires=True)
-                LOGGER.debug("Read cookies from %s" % cookiejar_path)
-            except:  # pylint: disable=bare-except
-                # Most likely a pickled cookiejar from earlier versions.
-                # The cookiejar will get replaced with a valid one after
-                # successful authentication.
-                LOGGER.warning("Failed to read cookiejar %s" % cookiejar_path)
-
-        self.authenticate()
+        self.session.cookies = cookielib.LWPCookieJar(filename=self.cookiejar_path)
+        self.session_store.load_cookies(self.session.cookies)
 
-        self._drive = None
-        self._files = None
-        self._photos = None
+        # Deferred, authentication happens on first use or via login_async()
+        if not defer_auth:
+            self.authenticate()
 
     def authenticate(self, force_refresh=False, service=None):
         """
         Handles authentication, and persists cookies so that
         subsequent logins will not cause additional e-mails from Apple.
         """
+        with self._auth_lock:
+            self._authenticate(force_refresh, service)
+            self.auth_generation += 1
+            self._authenticated = True
+
+    def _ensure_authenticated(self):
+        """Authenticates now if authentication was deferred."""
+        if not self._authenticated:
+            with self._auth_lock:
+                if not self._authenticated:
+                    self.authenticate()
+
+    def login_async(self):
+        """
+        Authenticates on a background thread, returning a
+        `concurrent.futures.Future` resolved once logged in.
 
+        Calls made while a login is running share its future.
+        """
+        with self._services_lock:
+            future = self._login_future
+            if future is None or (future.done() and future.exception()):
+                executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="pyicloud-login"
+                )
+                future = executor.submit(self._ensure_authenticated)
+                executor.shutdown(wait=False)
+                self._login_future = future
+        return future
+
+    def reauthenticate(self, generation, service=None):
+        """
+        Forces a new authentication, unless another thread already
+        re-authenticated since `generation` was read.
+        """
+        with self._auth_lock:
+            if self.auth_generation != generation:
+                LOGGER.debug("Session was already re-authenticated")
+                return
+            try:
+                self.authenticate(True, service)
+            except PyiCloudException:
+                LOGGER.debug("Re-authentication failed")
+                # Don't let every waiting thread try again
+                self.auth_generation += 1
+
+    def refresh_session(self):
+        """
+        Validates the session token now, which extends the session, and
+        falls back to logging in again with the token, then from scratch.
+        """
+        with self._auth_lock:
+            generation = self.auth_generation
+            try:
+                self.data = self._validate_token()
+            except PyiCloudAPIResponseException:
+                try:
+                    self._authenticate_with_token()
+                except PyiCloudFailedLoginException:
+                    LOGGER.debug("Session expired, logging in again")
+                    self.reauthenticate(generation)
+                    return
+            self._set_webservices(self.data["webservices"])
+            self.unvalidated = False
+            self._save_account_data()
+
+    def start_keepalive(self, **kwargs):
+        """
+        Starts refreshing the session in the background before it
+        expires, see `SessionKeepAlive` for the arguments.
+        """
+        with self._services_lock:
+            if self._keepalive is None:
+                self._keepalive = SessionKeepAlive(self, **kwargs).start()
+        return self._keepalive
+
+    def stop_keepalive(self):
+        """Stops the background session refresh, if started."""
+        with self._services_lock:
+            keepalive, self._keepalive = self._keepalive, None
+        if keepalive is not None:
+            keepalive.stop()
+
+    def close(self):
+        """
+        Stops the background work, flushes the session and detaches the
+        password filters from the shared loggers. The HTTP session is left
+        open, as its transport may be shared.
+        """
+        self.stop_keepalive()
+        LOGGER.removeFilter(self.password_filter)
+        with self.session._lock:  # pylint: disable=protected-access
+            request_loggers = list(
+                self.session._request_loggers.values()  # pylint: disable=protected-access
+            )
+        for request_logger in request_loggers:
+            request_logger.removeFilter(self.password_filter)
+        self.session_store.close()
+
+    def revalidate(self, generation):
+        """
+        Validates a session reused within the validation window, unless
+        another thread already authenticated since `generation` was read.
+        """
+        with self._auth_lock:
+            if self.auth_generation != generation or not self.unvalidated:
+                return
+            with self.session._lock:  # pylint: disable=protected-access
+                self.session_data.pop("validated_at", None)
+            try:
+                self.authenticate()
+            except PyiCloudException:
+                LOGGER.debug("Re-validation failed")
+                self.auth_generation += 1
+
+    def _is_recently_validated(self):
+        validated_at = self.session_data.get("validated_at")
+        return (
+            self.validation_window > 0
+            and validated_at is not None
+            and self.session_data.get("account_data") is not None
+            and time.time() - validated_at < self.validation_window
+        )
+
+    def _save_account_data(self):
+        """Persists the account data along with when it was validated."""
+        with self.session._lock:  # pylint: disable=protected-access
+            self.session_data.update(
+                {"account_data": self.data, "validated_at": time.time()}
+            )
+            self.session_store.save(self.session_data, self.session.cookies)
+
+    def _authenticate(self, force_refresh, service):
         login_successful = False
-        if self.session_data.get("session_token") and not force_refresh:
+        self.unvalidated = False
+        if (
+            self.session_data.get("session_token")
+            and not force_refresh
+            and self._is_recently_validated()
+        ):
+            LOGGER.debug("Session was validated recently, skipping validation")
+            self.data = self.session_data["account_data"]
+            self.unvalidated = True
+            login_successful = True
+
+        if (
+            self.session_data.get("session_token")
+            and not force_refresh
+            and not login_successful
+        ):
             LOGGER.debug("Checking session token validity")
             try:
                 self.data = self._validate_token()
@@ -289,7 +993,7 @@ class PyiCloudService(object):
         if not login_successful and service != None:
             app = self.data["apps"][service]
             if "canLaunchWithOneFactor" in app and app["canLaunchWithOneFactor"] == True:
-                LOGGER.debug("Authenticating as %s for %s" % (self.user["accountName"], service))
+                LOGGER.debug("Authenticating as %s for %s", self.user["accountName"], service)
                 try:
                     self._authenticate_with_credentials_service(service)
                     login_successful = True
@@ -297,7 +1001,7 @@ class PyiCloudService(object):
                     LOGGER.debug("Could not log into service. Attempting brand new login.")
 
         if not login_successful:
-            LOGGER.debug("Authenticating as %s" % self.user["accountName"])
+            LOGGER.debug("Authenticating as %s", self.user["accountName"])
 
             data = dict(self.user)
 
@@ -327,10 +1031,19 @@ class PyiCloudService(object):
 
             self._authenticate_with_token()
 
-        self._webservices = self.data["webservices"]
+        self._set_webservices(self.data["webservices"])
+        if not self.unvalidated:
+            self._save_account_data()
 
         LOGGER.debug("Authentication completed successfully")
 
+    def _set_webservices(self, webservices):
+        if webservices != getattr(self, "_webservices", None):
+            # Services keep their root URL, rebuild them on the new ones
+            self.invalidate()
+        self._webservices = webservices
+        self.session.mount_webservices(webservices)
+
     def _authenticate_with_token(self):
         """Authenticate using session token."""
         data = {
@@ -399,21 +1112,18 @@ class PyiCloudService(object):
     def cookiejar_path(self):
         """Get path for cookiejar file."""
         return path.join(
-            self._cookie_directory,
-            "".join([c for c in self.user.get("accountName") if match(r"\w", c)]),
+            self._cookie_directory, NON_WORD_CHARS.sub("", self.user.get("accountName"))
         )
 
     @property
     def session_path(self):
         """Get path for session data file."""
-        return path.join(
-            self._cookie_directory,
-            "".join([c for c in self.user.get("accountName") if match(r"\w", c)]) + '.session',
-        )
+        return self.cookiejar_path + ".session"
 
     @property
     def requires_2sa(self):
         """Returns True if two-step authentication is required."""
+        self._ensure_authenticated()
         return self.data.get("dsInfo", {}).get("hsaVersion", 0) >= 1 and (
             self.data.get("hsaChallengeRequired", False) or not self.is_trusted_session
         )
@@ -421,6 +1131,7 @@ class PyiCloudService(object):
     @property
     def requires_2fa(self):
         """Returns True if two-factor authentication is required."""
+        self._ensure_authenticated()
         return self.data["dsInfo"].get("hsaVersion", 0) == 2 and (
             self.data.get("hsaChallengeRequired", False) or not self.is_trusted_session
         )
@@ -428,6 +1139,7 @@ class PyiCloudService(object):
     @property
     def is_trusted_session(self):
         """Returns True if the session is trusted."""
+        self._ensure_authenticated()
         return self.data.get("hsaTrustedBrowser", False)
 
     @property
@@ -515,6 +1227,7 @@ class PyiCloudService(object):
                 headers=headers,
             )
             self._authenticate_with_token()
+            self._save_account_data()
             return True
         except PyiCloudAPIResponseException:
             LOGGER.error("Session trust failed.")
@@ -522,18 +1235,68 @@ class PyiCloudService(object):
 
     def _get_webservice_url(self, ws_key):
         """Get webservice URL, raise an exception if not exists."""
+        self._ensure_authenticated()
         if self._webservices.get(ws_key) is None:
             raise PyiCloudServiceNotActivatedException(
                 "Webservice not available", ws_key
             )
         return self._webservices[ws_key]["url"]
 
+    def _get_service(self, name, factory):
+        """Returns a memoized service, built once even from many threads."""
+        service = self._services.get(name)
+        if service is None:
+            # One lock per service, so building one doesn't block the others
+            with self._services_lock:
+                lock = self._service_locks.setdefault(name, threading.Lock())
+            with lock:
+                service = self._services.get(name)
+                if service is None:
+                    service = self._services[name] = factory()
+        return service
+
+    def invalidate(self, name=None):
+        """
+        Forgets a memoized service (e.g. "devices"), or all of them, so
+        the next access builds it again.
+        """
+        with self._services_lock:
+            if name is None:
+                self._services = {}
+            else:
+                self._services.pop(name, None)
+
+    def refresh(self, name):
+        """
+        Refreshes the data of a service (e.g. "devices") and returns it.
+        A service built by this call is already up to date.
+        """
+        service = self._services.get(name)
+        if service is None:
+            return getattr(self, name)
+        # Looked up on the class: the __getattr__ of some services (drive,
+        # files) would fetch their root folder first
+        refresh = getattr(
+            type(service), SERVICE_REFRESH_METHODS.get(name, "refresh_client"), None
+        )
+        if refresh is None:
+            # Nothing to refresh in place (photos, drive...), start over
+            self.invalidate(name)
+            return getattr(self, name)
+        refresh(service)
+        return service
+
     @property
     def devices(self):
         """Returns all devices."""
-        service_root = self._get_webservice_url("findme")
-        return FindMyiPhoneServiceManager(
-            service_root, self.session, self.params, self.with_family
+        return self._get_service(
+            "devices",
+            lambda: services.FindMyiPhoneServiceManager(
+                self._get_webservice_url("findme"),
+                self.session,
+                self.params,
+                self.with_family,
+            ),
         )
 
     @property
@@ -544,54 +1307,75 @@ class PyiCloudService(object):
     @property
     def account(self):
         """Gets the 'Account' service."""
-        service_root = self._get_webservice_url("account")
-        return AccountService(service_root, self.session, self.params)
+        return self._get_service(
+            "account",
+            lambda: services.AccountService(
+                self._get_webservice_url("account"), self.session, self.params
+            ),
+        )
 
     @property
     def files(self):
         """Gets the 'File' service."""
-        if not self._files:
-            service_root = self._get_webservice_url("ubiquity")
-            self._files = UbiquityService(service_root, self.session, self.params)
-        return self._files
+        return self._get_service(
+            "files",
+            lambda: services.UbiquityService(
+                self._get_webservice_url("ubiquity"), self.session, self.params
+            ),
+        )
 
     @property
     def photos(self):
         """Gets the 'Photo' service."""
-        if not self._photos:
-            service_root = self._get_webservice_url("ckdatabasews")
-            self._photos = PhotosService(service_root, self.session, self.params)
-        return self._photos
+        return self._get_service(
+            "photos",
+            lambda: services.PhotosService(
+                self._get_webservice_url("ckdatabasews"), self.session, self.params
+            ),
+        )
 
     @property
     def calendar(self):
         """Gets the 'Calendar' service."""
-        service_root = self._get_webservice_url("calendar")
-        return CalendarService(service_root, self.session, self.params)
+        return self._get_service(
+            "calendar",
+            lambda: services.CalendarService(
+                self._get_webservice_url("calendar"), self.session, self.params
+            ),
+        )
 
     @property
     def contacts(self):
         """Gets the 'Contacts' service."""
-        service_root = self._get_webservice_url("contacts")
-        return ContactsService(service_root, self.session, self.params)
+        return self._get_service(
+            "contacts",
+            lambda: services.ContactsService(
+                self._get_webservice_url("contacts"), self.session, self.params
+            ),
+        )
 
     @property
     def reminders(self):
         """Gets the 'Reminders' service."""
-        service_root = self._get_webservice_url("reminders")
-        return RemindersService(service_root, self.session, self.params)
+        return self._get_service(
+            "reminders",
+            lambda: services.RemindersService(
+                self._get_webservice_url("reminders"), self.session, self.params
+            ),
+        )
 
     @property
     def drive(self):
         """Gets the 'Drive' service."""
-        if not self._drive:
-            self._drive = DriveService(
+        return self._get_service(
+            "drive",
+            lambda: services.DriveService(
                 service_root=self._get_webservice_url("drivews"),
                 document_root=self._get_webservice_url("docws"),
                 session=self.session,
                 params=self.params,
-            )
-        return self._drive
+            ),
+        )
 
     def __unicode__(self):
         return "iCloud API: %s" % self.user.get("accountName")
@@ -0,0 +1,314 @@
+"""HTTP cache for idempotent iCloud reads."""
+from collections import OrderedDict
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_AGE = re.compile(r"(?:^|,)\s*max-age\s*=\s*\"?(\d+)", re.IGNORECASE)
+
+# Headers describing the encoded body, which is stored decoded
+_ENCODING_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+class MemoryCache(object):
+    """In-memory storage, evicting the least recently used entries.
+
+    Bounded by both `max_entries` and `max_bytes` of response bodies.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the entry stored under `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        """Stores an entry, evicting others as needed."""
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous["body"])
+            if len(entry["body"]) > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._size += len(entry["body"])
+            while (
+                len(self._entries) > self.max_entries or self._size > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted["body"])
+
+    def delete(self, key):
+        """Removes an entry, if present."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= len(entry["body"])
+
+    def clear(self):
+        """Removes every entry."""
+        with self._lock:
+            self._entries = OrderedDict()
+            self._size = 0
+
+
+class DiskCache(object):
+    """On-disk storage, one JSON file per entry, for caches across runs.
+
+    Entries are evicted least recently used first (by file modification
+    time) once their total size exceeds `max_bytes`. Cached responses hold
+    personal data and must be protected like the session files.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, 0o700)
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, key):
+        return os.path.join(
+            self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest()
+        )
+
+    def get(self, key):
+        """Returns the entry stored under `key`, or None."""
+        filename = self._path(key)
+        try:
+            with open(filename) as entry_f:
+                entry = json.load(entry_f)
+            os.utime(filename, None)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get("key") != key:
+            return None
+        entry["body"] = base64.b64decode(entry["body"])
+        return entry
+
+    def set(self, key, entry):
+        """Stores an entry, evicting others as needed."""
+        if len(entry["body"]) > self.max_bytes:
+            return
+        stored = dict(entry)
+        stored["key"] = key
+        stored["body"] = base64.b64encode(entry["body"]).decode("ascii")
+        filename = self._path(key)
+        tmp_filename = "%s.%d.tmp" % (filename, threading.get_ident())
+        with open(tmp_filename, "w") as entry_f:
+            json.dump(stored, entry_f)
+        os.replace(tmp_filename, filename)
+        with self._lock:
+            if self._size is not None:
+                self._size += os.path.getsize(filename)
+            self._evict()
+
+    def _evict(self):
+        if self._size is not None and self._size <= self.max_bytes:
+            return
+        files = []
+        for name in os.listdir(self.directory):
+            filename = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, filename))
+        self._size = sum(size for (_, size, _) in files)
+        for _, size, filename in sorted(files):
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+            self._size -= size
+
+    def delete(self, key):
+        """Removes an entry, if present."""
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+        with self._lock:
+            self._size = None
+
+    def clear(self):
+        """Removes every entry."""
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        with self._lock:
+            self._size = None
+
+
+class HTTPCache(object):
+    """Caching policy for the GET requests of a session to its webservices.
+
+    Authentication endpoints are never cached, and the session headers of
+    cached responses are ignored.
+
+    Responses are reused without any request while fresh, per their
+    ``Cache-Control: max-age``, or else per `ttl`: seconds, or a dict of
+    seconds keyed by webservice (and ``default``). Once stale, responses
+    carrying an ``ETag`` or ``Last-Modified`` are revalidated with a
+    conditional request, and a 304 reuses the stored body. ``no-store``
+    responses are never stored, ``no-cache`` ones always revalidated.
+
+    Any other request to a webservice (a POST, say) may change its data,
+    so it makes that webservice's cached responses unreachable.
+
+    Usage:
+        api = PyiCloudService(apple_id, password,
+                              http_cache=HTTPCache(DiskCache("~/.pyicloud"),
+                                                   ttl={"account": 300}))
+    """
+
+    def __init__(self, storage=None, ttl=None):
+        self.storage = storage if storage is not None else MemoryCache()
+        self.ttl = ttl
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def _get_lifetime(self, ws_key, response):
+        """Returns how long a response stays fresh, in seconds."""
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if "no-cache" in cache_control:
+            return 0
+        max_age = MAX_AGE.search(cache_control)
+        if max_age:
+            return int(max_age.group(1))
+        if isinstance(self.ttl, dict):
+            return self.ttl.get(ws_key, self.ttl.get("default"))
+        return self.ttl
+
+    def key(self, namespace, ws_key, url):
+        """Returns the storage key of a GET request."""
+        return "%s %s %d GET %s" % (
+            namespace,
+            ws_key,
+            self._generations.get(ws_key, 0),
+            url,
+        )
+
+    def invalidate(self, ws_key):
+        """Forgets the cached responses of a webservice."""
+        with self._lock:
+            self._generations[ws_key] = self._generations.get(ws_key, 0) + 1
+
+    def lookup(self, key):
+        """Returns ``(entry, fresh)`` for a request, entry being None on a miss."""
+        entry = self.storage.get(key)
+        if entry is None:
+            self._count("misses")
+            return None, False
+        if entry["expires"] is not None and entry["expires"] > time.time():
+            self._count("hits")
+            return entry, True
+        if entry["etag"] or entry["last_modified"]:
+            return entry, False
+        self._count("misses")
+        return None, False
+
+    def conditional_headers(self, entry):
+        """Returns the headers revalidating a stale entry."""
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, key, ws_key, response):
+        """Stores a 200 response, if its headers and the TTL policy allow."""
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if "no-store" in cache_control or response.headers.get("Vary") == "*":
+            return
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        lifetime = self._get_lifetime(ws_key, response)
+        if not lifetime and not (etag or last_modified):
+            return
+
+        self.storage.set(
+            key,
+            {
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": [
+                    [name, value]
+                    for (name, value) in response.headers.items()
+                    if name.lower() not in _ENCODING_HEADERS
+                ],
+                "body": response.content,
+                "etag": etag,
+                "last_modified": last_modified,
+                "expires": time.time() + lifetime if lifetime else None,
+            },
+        )
+
+    def refresh(self, key, ws_key, entry, response):
+        """Updates an entry revalidated by a 304, returning it."""
+        lifetime = self._get_lifetime(ws_key, response)
+        entry = dict(entry)
+        entry["etag"] = response.headers.get("ETag", entry["etag"])
+        entry["last_modified"] = response.headers.get(
+            "Last-Modified", entry["last_modified"]
+        )
+        entry["expires"] = time.time() + lifetime if lifetime else None
+        self.storage.set(key, entry)
+        self._count("revalidated")
+        return entry
+
+    def build_response(self, entry, request):
+        """Returns a response answering `request` from a cache entry."""
+        response = Response()
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.headers["Content-Length"] = str(len(entry["body"]))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry["body"]  # pylint: disable=protected-access
+        response.url = request.url
+        response.request = request
+        response.from_cache = True
+        return response
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        """Returns the hit, revalidation and miss counts."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+            }
@@ -0,0 +1,227 @@
+"""Record/replay transport, for offline tests and benchmarks.
+
+A `CassetteAdapter` is a `requests` transport adapter. In ``record`` mode
+it sends requests to iCloud and stores every request/response pair in a
+JSON cassette; in ``replay`` mode it answers from the cassette without any
+network access, optionally adding latency. Plug it into a service with
+``PyiCloudService(..., transport=CassetteAdapter("icloud.json", "once"))``.
+
+Requests are matched on method, URL and a SHA-256 digest of the body.
+Passwords are left out of the digest of login requests, which could
+otherwise be guessed offline from the cassette. Repeated identical requests
+(like Find My refreshes or CloudKit pages) are replayed in recorded order.
+Cassettes do contain the session tokens and personal data returned by
+iCloud and must be handled like the session files.
+"""
+import atexit
+import base64
+import hashlib
+import http.client
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+from pyicloud.exceptions import PyiCloudCassetteMissException
+
+LOGGER = logging.getLogger(__name__)
+
+# Headers that describe the encoded body, which is stored decoded
+_ENCODING_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def _body_digest(body):
+    if body is None:
+        return None
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if not isinstance(body, (bytes, bytearray)):
+        # Streamed uploads can't be read without consuming them
+        return "stream"
+    if b'"password"' in body:
+        body = _without_password(body)
+    return hashlib.sha256(body).hexdigest()
+
+
+def _without_password(body):
+    """Returns a login request body without its password."""
+    try:
+        data = json.loads(body.decode("utf-8"))
+    except ValueError:
+        return body
+    if not isinstance(data, dict) or "password" not in data:
+        return body
+    del data["password"]
+    return json.dumps(data, sort_keys=True).encode("utf-8")
+
+
+class _OriginalResponse(object):
+    """Minimal http.client response, so cookies get extracted on replay."""
+
+    def __init__(self, headers):
+        self.msg = http.client.HTTPMessage()
+        for name, value in headers:
+            self.msg[name] = value
+
+    def isclosed(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class CassetteAdapter(HTTPAdapter):
+    """Transport adapter recording to, or replaying from, a cassette.
+
+    Modes:
+        ``record``: always use the network, overwrite the cassette.
+        ``replay``: never use the network; unknown requests raise.
+        ``once``: replay if the cassette exists, record otherwise.
+
+    `latency` adds a fixed delay (seconds) to every replayed response;
+    `recorded_latency` replays the latency measured while recording
+    instead.
+    """
+
+    def __init__(
+        self, path, mode="once", latency=0.0, recorded_latency=False, **kwargs
+    ):
+        super(CassetteAdapter, self).__init__(**kwargs)
+        if mode == "once":
+            mode = "replay" if os.path.exists(path) else "record"
+        if mode not in ("record", "replay"):
+            raise ValueError("Unknown cassette mode: %s" % mode)
+
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.recorded_latency = recorded_latency
+
+        self._lock = threading.Lock()
+        self._interactions = []
+        self._by_request = {}
+        self._by_url = {}
+        self._played = {}
+        self._dirty = False
+
+        if mode == "replay":
+            self.load()
+        else:
+            atexit.register(self.save)
+
+    def load(self):
+        """Loads the cassette file."""
+        with open(self.path) as cassette_f:
+            cassette = json.load(cassette_f)
+        for interaction in cassette["interactions"]:
+            self._add(interaction)
+        LOGGER.debug(
+            "Loaded %d interactions from %s", len(self._interactions), self.path
+        )
+
+    def save(self):
+        """Writes recorded interactions to the cassette file."""
+        with self._lock:
+            if self.mode != "record" or not self._dirty:
+                return
+            tmp_path = "%s.tmp" % self.path
+            with open(tmp_path, "w") as cassette_f:
+                json.dump({"version": 1, "interactions": self._interactions}, cassette_f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        LOGGER.debug(
+            "Saved %d interactions to %s", len(self._interactions), self.path
+        )
+
+    def _add(self, interaction):
+        request = interaction["request"]
+        self._interactions.append(interaction)
+        self._by_request.setdefault(
+            (request["method"], request["url"], request["body"]), []
+        ).append(interaction)
+        self._by_url.setdefault((request["method"], request["url"]), []).append(
+            interaction
+        )
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        if self.mode == "record":
+            return self._record(request, **kwargs)
+        return self._replay(request)
+
+    def _record(self, request, **kwargs):
+        started = time.time()
+        response = super(CassetteAdapter, self).send(request, **kwargs)
+        body = response.content
+        elapsed = time.time() - started
+
+        with self._lock:
+            self._add(
+                {
+                    "request": {
+                        "method": request.method,
+                        "url": request.url,
+                        "body": _body_digest(request.body),
+                    },
+                    "response": {
+                        "status": response.status_code,
+                        "reason": response.reason,
+                        "headers": [
+                            [name, value]
+                            for (name, value) in response.raw.headers.items()
+                            if name.lower() not in _ENCODING_HEADERS
+                        ],
+                        "body": base64.b64encode(body).decode("ascii"),
+                        "elapsed": elapsed,
+                    },
+                }
+            )
+            self._dirty = True
+        return response
+
+    def _replay(self, request):
+        key = (request.method, request.url)
+        with self._lock:
+            candidates = self._by_request.get(key + (_body_digest(request.body),))
+            if not candidates:
+                # Bodies with timestamps or random ids never match exactly
+                candidates = self._by_url.get(key)
+            if not candidates:
+                raise PyiCloudCassetteMissException(
+                    "No recorded response for %s %s" % key
+                )
+            index = self._played.get(id(candidates), 0)
+            self._played[id(candidates)] = index + 1
+            # Once exhausted, keep answering with the last recording
+            recorded = candidates[min(index, len(candidates) - 1)]["response"]
+
+        if self.recorded_latency:
+            time.sleep(recorded.get("elapsed", 0))
+        elif self.latency:
+            time.sleep(self.latency)
+
+        body = base64.b64decode(recorded["body"])
+        headers = recorded["headers"] + [["Content-Length", str(len(body))]]
+        raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers=headers,
+            status=recorded["status"],
+            reason=recorded["reason"],
+            preload_content=False,
+            decode_content=False,
+            original_response=_OriginalResponse(headers),
+        )
+        return self.build_response(request, raw)
+
+    def rewind(self):
+        """Replays the cassette from the start again."""
+        with self._lock:
+            self._played = {}
+
+    def close(self):
+        self.save()
+        super(CassetteAdapter, self).close()
@@ -7,6 +7,7 @@ command line scripts, and related.
 from __future__ import print_function
 from builtins import input
 import argparse
+import atexit
 import pickle
 import sys
 
@@ -33,6 +34,11 @@ def create_pickled_data(idevice, filename):
     pickle_file.close()
 
 
+def print_stats(api):
+    """Prints the HTTP metrics collected by the session to stderr."""
+    print(api.session.metrics.format(), file=sys.stderr)
+
+
 def main(args=None):
     """Main commandline entrypoint."""
     if args is None:
@@ -160,6 +166,15 @@ def main(args=None):
         help="Forcibly display this message when activating lost mode.",
     )
 
+    # Dump HTTP metrics on exit
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        dest="stats",
+        default=False,
+        help="Print per-endpoint HTTP statistics on exit.",
+    )
+
     # Output device data to an pickle file
     parser.add_argument(
         "--outputfile",
@@ -268,6 +283,9 @@ def main(args=None):
 
             print(message, file=sys.stderr)
 
+    if command_line.stats:
+        atexit.register(print_stats, api)
+
     for dev in api.devices:
         if not command_line.device_id or (
             command_line.device_id.strip().lower() == dev.content["id"].strip().lower()
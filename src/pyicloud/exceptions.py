@@ -48,3 +48,17 @@ class PyiCloudNoStoredPasswordAvailableException(PyiCloudException):
 class PyiCloudNoDevicesException(PyiCloudException):
     """iCloud no device exception."""
     pass
+
+
+# Transport
+class PyiCloudCassetteMissException(PyiCloudException):
+    """No recorded response matches a request replayed from a cassette."""
+    pass
+
+
+class PyiCloudRateLimitException(PyiCloudException):
+    """A request was rejected by the client-side rate limiter."""
+    def __init__(self, webservice):
+        self.webservice = webservice
+        message = "Rate limit exceeded for webservice: %s" % webservice
+        super(PyiCloudRateLimitException, self).__init__(message)
@@ -0,0 +1,79 @@
+"""Background session keep-alive."""
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SessionKeepAlive(object):
+    """Refreshes a service's session before it expires.
+
+    Once the session was last validated `refresh_after` seconds ago, and no
+    request went out for `idle_time` seconds, the token is validated again
+    (or the account logged in again), so interactive calls don't pay for
+    an expired session. Sessions are checked every `check_interval`
+    seconds.
+
+    Run it on its own daemon thread with `start`, or call `tick`
+    periodically from a scheduler shared by many services.
+    """
+
+    def __init__(self, service, refresh_after=600, idle_time=30, check_interval=60):
+        self.service = service
+        self.refresh_after = refresh_after
+        self.idle_time = idle_time
+        self.check_interval = check_interval
+        self.refreshes = 0
+        self.failures = 0
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def is_due(self, now=None):
+        """Returns True if the session should be refreshed now."""
+        service = self.service
+        if not service._authenticated:  # pylint: disable=protected-access
+            # Deferred login: nothing to keep alive yet
+            return False
+        now = now or time.time()
+        validated_at = service.session_data.get("validated_at") or 0
+        return (
+            now - validated_at >= self.refresh_after
+            and now - service.session.last_request_at >= self.idle_time
+        )
+
+    def tick(self):
+        """Refreshes the session if due; returns True if it was refreshed."""
+        if not self.is_due():
+            return False
+        try:
+            self.service.refresh_session()
+        except Exception as error:  # pylint: disable=broad-except
+            self.failures += 1
+            LOGGER.warning("Session keep-alive failed: %s", error)
+            return False
+        self.refreshes += 1
+        return True
+
+    def start(self):
+        """Runs the keep-alive on a daemon thread."""
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="pyicloud-keepalive"
+            )
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the keep-alive thread."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.check_interval):
+            self.tick()
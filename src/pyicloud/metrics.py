@@ -0,0 +1,198 @@
+"""HTTP metrics."""
+from collections import Counter
+import re
+import threading
+
+from six.moves.urllib.parse import urlparse
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    float("inf"),
+)
+
+# Path segments that identify a record rather than an endpoint
+ID_SEGMENT = re.compile(r"^(\d+|[0-9A-Fa-f-]{16,}|[^/]*::[^/]*)$")
+
+
+def endpoint_name(method, url, webservice=None):
+    """Returns the metrics key of a request, e.g. ``POST findme /fmipservice/...``.
+
+    Numeric and id-like path segments are collapsed to ``{id}`` so requests
+    for different records add up under the same endpoint.
+    """
+    parts = urlparse(url)
+    path = "/".join(
+        "{id}" if ID_SEGMENT.match(segment) else segment
+        for segment in parts.path.split("/")
+    )
+    return "%s %s %s" % (method.upper(), webservice or parts.netloc, path or "/")
+
+
+class _EndpointStats(object):
+    def __init__(self):
+        self.count = 0
+        self.retries = 0
+        self.errors = 0
+        self.statuses = Counter()
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_total = 0.0
+        self.latency_min = None
+        self.latency_max = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def percentile(self, fraction):
+        """Estimates a latency percentile from the histogram."""
+        if not self.count:
+            return None
+        threshold = fraction * self.count
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, self.latency_buckets):
+            cumulative += bucket
+            if cumulative >= threshold:
+                return min(bound, self.latency_max)
+        return self.latency_max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "statuses": dict(self.statuses),
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "latency": {
+                "min": self.latency_min,
+                "max": self.latency_max,
+                "mean": self.latency_total / self.count if self.count else None,
+                "p50": self.percentile(0.5),
+                "p90": self.percentile(0.9),
+                "p99": self.percentile(0.99),
+                "buckets": dict(zip(LATENCY_BUCKETS, self.latency_buckets)),
+            },
+        }
+
+
+class MetricsCollector(object):
+    """Collects per-endpoint HTTP metrics for a session.
+
+    Every attempt of a request is recorded, so retried requests show up as
+    several attempts plus a retry count.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _stats(self, endpoint):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = _EndpointStats()
+        return stats
+
+    def record(
+        self, endpoint, status_code, latency, request_bytes=0, response_bytes=0
+    ):
+        """Records one request attempt. `status_code` is None on errors."""
+        with self._lock:
+            stats = self._stats(endpoint)
+            stats.count += 1
+            stats.statuses[status_code] += 1
+            if status_code is None or status_code >= 400:
+                stats.errors += 1
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    stats.latency_buckets[index] += 1
+                    break
+            stats.latency_total += latency
+            if stats.latency_min is None or latency < stats.latency_min:
+                stats.latency_min = latency
+            stats.latency_max = max(stats.latency_max, latency)
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+
+    def record_retry(self, endpoint):
+        """Records that a request to `endpoint` is being retried."""
+        with self._lock:
+            self._stats(endpoint).retries += 1
+
+    def snapshot(self):
+        """Returns a copy of the metrics, keyed by endpoint."""
+        with self._lock:
+            return {
+                endpoint: stats.as_dict()
+                for (endpoint, stats) in self._endpoints.items()
+            }
+
+    def reset(self):
+        """Discards all collected metrics."""
+        with self._lock:
+            self._endpoints = {}
+
+    def format(self):
+        """Returns the metrics as a human readable table."""
+        lines = [
+            "%-70s %6s %5s %5s %9s %9s %9s %10s %10s"
+            % (
+                "endpoint",
+                "count",
+                "err",
+                "retry",
+                "mean ms",
+                "p90 ms",
+                "max ms",
+                "sent",
+                "received",
+            )
+        ]
+        for endpoint, stats in sorted(self.snapshot().items()):
+            latency = stats["latency"]
+            lines.append(
+                "%-70s %6d %5d %5d %9.1f %9.1f %9.1f %10d %10d"
+                % (
+                    endpoint[:70],
+                    stats["count"],
+                    stats["errors"],
+                    stats["retries"],
+                    (latency["mean"] or 0) * 1000,
+                    (latency["p90"] or 0) * 1000,
+                    latency["max"] * 1000,
+                    stats["request_bytes"],
+                    stats["response_bytes"],
+                )
+            )
+        return "\n".join(lines)
+
+
+def request_size(request):
+    """Returns the body size of a prepared request, when known."""
+    body = request.body if request is not None else None
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    length = request.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else 0
+
+
+def response_size(response, stream=False):
+    """Returns the body size of a response without consuming streams."""
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit():
+        return int(length)
+    if stream:
+        return 0
+    return len(response.content or b"")
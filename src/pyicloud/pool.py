@@ -0,0 +1,203 @@
+"""Many iCloud accounts served from one process.
+
+An `AccountPool` owns one `PyiCloudService` per Apple ID. Cookies and
+session data stay per account (in their own files, or in rows of a shared
+SQLite database), while the accounts share one bounded connection pool and
+one worker executor. Accounts are added without logging in; they
+authenticate on first use or through `login_all`.
+
+Usage:
+    from pyicloud.pool import AccountPool
+
+    pool = AccountPool(max_workers=16, session_database="sessions.db")
+    for apple_id, password in credentials:
+        pool.add(apple_id, password)
+    for apple_id, result in pool.refresh_find_my().items():
+        if result.error:
+            ...
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+from requests.adapters import HTTPAdapter
+
+from pyicloud.base import PyiCloudService
+from pyicloud.keepalive import SessionKeepAlive
+
+LOGGER = logging.getLogger(__name__)
+
+# Outcome of a fan-out call for one account: `error` is None on success
+AccountResult = namedtuple("AccountResult", ["value", "error"])
+
+
+def _call(func, api, args, kwargs):
+    try:
+        return AccountResult(func(api, *args, **kwargs), None)
+    except Exception as error:  # pylint: disable=broad-except
+        LOGGER.debug("%s failed for %s: %s", func, api.user["accountName"], error)
+        return AccountResult(None, error)
+
+
+class AccountPool(object):
+    """Pool of iCloud accounts sharing transport and worker threads.
+
+    `max_workers` bounds the threads running fan-out calls and
+    `max_connections` the connections kept per host, shared by all
+    accounts (requests wait for a free connection rather than opening
+    more). `max_hosts` bounds the hosts connections are kept to: accounts
+    live on partitioned hosts (``pNN-*.icloud.com``), so it should cover
+    the partitions and webservices of all the accounts, or pools keep
+    being evicted and reopened. Other keyword arguments are passed to
+    every `PyiCloudService` (or `service_class`), e.g.
+    ``cookie_directory``, ``session_database`` or ``rate_limits``.
+
+    Accounts share `transport` (by default an adapter built from the
+    above), which replaces their per-webservice ``pool_config``.
+    """
+
+    def __init__(
+        self,
+        max_workers=16,
+        max_connections=None,
+        max_hosts=256,
+        transport=None,
+        service_class=None,
+        **service_kwargs
+    ):
+        self.service_class = service_class or PyiCloudService
+        self.service_kwargs = service_kwargs
+        self.transport = transport or HTTPAdapter(
+            pool_connections=max_hosts,
+            pool_maxsize=max_connections or max_workers,
+            pool_block=True,
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pyicloud-pool"
+        )
+        self._accounts = {}
+        self._lock = threading.Lock()
+        self._keepalives = {}
+        self._keepalive_stopped = threading.Event()
+        self._keepalive_thread = None
+
+    def add(self, apple_id, password=None, **kwargs):
+        """Adds an account, without logging in, and returns its service."""
+        service_kwargs = dict(self.service_kwargs)
+        service_kwargs.update(kwargs)
+        service_kwargs.setdefault("defer_auth", True)
+        service_kwargs["transport"] = self.transport
+        api = self.service_class(apple_id, password, **service_kwargs)
+        with self._lock:
+            previous = self._accounts.get(apple_id)
+            self._accounts[apple_id] = api
+        if previous is not None:
+            previous.close()
+        return api
+
+    def remove(self, apple_id):
+        """Removes an account, flushing its session."""
+        with self._lock:
+            api = self._accounts.pop(apple_id)
+        api.close()
+
+    @property
+    def accounts(self):
+        """Returns the Apple IDs in the pool."""
+        with self._lock:
+            return list(self._accounts)
+
+    def __getitem__(self, apple_id):
+        return self._accounts[apple_id]
+
+    def __contains__(self, apple_id):
+        return apple_id in self._accounts
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def __iter__(self):
+        return iter(self.accounts)
+
+    def fan_out(self, func, *args, **kwargs):
+        """Calls ``func(service, *args, **kwargs)`` for every account.
+
+        Calls run concurrently on the pool's executor. Returns a dict of
+        `AccountResult` keyed by Apple ID; an exception raised for one
+        account is returned in its result and doesn't affect the others.
+        Pass ``accounts=[...]`` to only call some accounts.
+        """
+        accounts = kwargs.pop("accounts", None)
+        with self._lock:
+            if accounts is None:
+                services = dict(self._accounts)
+            else:
+                services = {
+                    apple_id: self._accounts[apple_id] for apple_id in accounts
+                }
+        futures = {
+            apple_id: self.executor.submit(_call, func, api, args, kwargs)
+            for (apple_id, api) in services.items()
+        }
+        return {apple_id: future.result() for (apple_id, future) in futures.items()}
+
+    def login_all(self, **kwargs):
+        """Authenticates every account that isn't already."""
+        return self.fan_out(
+            lambda api: api._ensure_authenticated(),  # pylint: disable=protected-access
+            **kwargs
+        )
+
+    def refresh_find_my(self, **kwargs):
+        """Refreshes Find My for every account, returning their devices."""
+        return self.fan_out(lambda api: api.refresh("devices"), **kwargs)
+
+    def start_keepalive(self, check_interval=60, **kwargs):
+        """Keeps every account's session fresh, see `SessionKeepAlive`.
+
+        A single scheduler thread checks all accounts and refreshes the due
+        ones on the pool's executor.
+        """
+        if self._keepalive_thread is not None:
+            return
+        self._keepalive_stopped.clear()
+        self._keepalive_thread = threading.Thread(
+            target=self._run_keepalive,
+            args=(check_interval, kwargs),
+            name="pyicloud-pool-keepalive",
+        )
+        self._keepalive_thread.daemon = True
+        self._keepalive_thread.start()
+
+    def stop_keepalive(self):
+        """Stops the keep-alive scheduler."""
+        self._keepalive_stopped.set()
+        if self._keepalive_thread is not None:
+            self._keepalive_thread.join()
+            self._keepalive_thread = None
+
+    def _run_keepalive(self, check_interval, kwargs):
+        while not self._keepalive_stopped.wait(check_interval):
+            with self._lock:
+                services = dict(self._accounts)
+            keepalives = {}
+            for apple_id, api in services.items():
+                keepalive = self._keepalives.get(apple_id)
+                if keepalive is None or keepalive.service is not api:
+                    keepalive = SessionKeepAlive(api, **kwargs)
+                keepalives[apple_id] = keepalive
+                if keepalive.is_due():
+                    self.executor.submit(keepalive.tick)
+            self._keepalives = keepalives
+
+    def close(self):
+        """Flushes every session and releases the threads and connections."""
+        self.stop_keepalive()
+        with self._lock:
+            services = list(self._accounts.values())
+            self._accounts = {}
+        for api in services:
+            api.close()
+        self.executor.shutdown(wait=True)
+        self.transport.close()
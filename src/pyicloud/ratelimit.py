@@ -0,0 +1,145 @@
+"""Client-side rate limiting of iCloud requests."""
+import threading
+import time
+
+from pyicloud.exceptions import PyiCloudRateLimitException
+
+# Responses meaning the servers are throttling us
+THROTTLE_CODES = frozenset([429, "ACCESS_DENIED"])
+
+
+class TokenBucket(object):
+    """Allows `rate` requests per second, in bursts of up to `burst`.
+
+    Waiting callers reserve their token before sleeping, so concurrent
+    callers are served in turn rather than all waking up at once.
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def reserve(self, max_wait=None):
+        """Takes a token; returns the seconds to wait before using it.
+
+        Returns None, without taking a token, if that would take more than
+        `max_wait` seconds.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = max(1 - self._tokens, 0) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def delay(self):
+        """Returns the seconds until a token is available, without taking it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(1 - self._tokens, 0) / self.rate
+
+    def pause(self, seconds):
+        """Makes the next token available in `seconds` at the earliest."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+
+class RateLimiter(object):
+    """Token buckets keyed by webservice (``findme``, ``ckdatabasews``, ...).
+
+    `limits` maps webservice keys to a rate (requests per second), a
+    ``(rate, burst)`` tuple or a `TokenBucket`; the ``default`` key applies
+    to the other webservices and to authentication endpoints. Requests to
+    webservices without a limit are never delayed.
+
+    With `block`, requests over the limit wait for their turn, for at most
+    `max_wait` seconds when set; otherwise, and past `max_wait`, they raise
+    `PyiCloudRateLimitException` right away.
+
+    Usage:
+        limiter = RateLimiter({"findme": (0.5, 2), "ckdatabasews": 10})
+        api = PyiCloudService(apple_id, password, rate_limits=limiter)
+    """
+
+    def __init__(self, limits, block=True, max_wait=None):
+        self.block = block
+        self.max_wait = max_wait
+        self.buckets = {}
+        for ws_key, limit in limits.items():
+            if not isinstance(limit, TokenBucket):
+                if isinstance(limit, (tuple, list)):
+                    limit = TokenBucket(*limit)
+                else:
+                    limit = TokenBucket(limit)
+            self.buckets[ws_key] = limit
+
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.waited = 0.0
+        self.rejected = 0
+
+    def _get_bucket(self, ws_key):
+        bucket = self.buckets.get(ws_key)
+        if bucket is None:
+            bucket = self.buckets.get("default")
+        return bucket
+
+    def acquire(self, ws_key):
+        """Waits until a request to `ws_key` may be sent.
+
+        Returns the number of seconds waited.
+        """
+        bucket = self._get_bucket(ws_key)
+        if bucket is None:
+            return 0.0
+        wait = bucket.reserve(self.max_wait if self.block else 0)
+        if wait is None:
+            with self._lock:
+                self.rejected += 1
+            raise PyiCloudRateLimitException(ws_key or "default")
+        if wait > 0:
+            with self._lock:
+                self.waits += 1
+                self.waited += wait
+            time.sleep(wait)
+        return wait
+
+    def delay(self, ws_key):
+        """Returns the seconds until a request to `ws_key` may be sent."""
+        bucket = self._get_bucket(ws_key)
+        if bucket is None:
+            return 0.0
+        return bucket.delay()
+
+    def pause(self, ws_key, seconds):
+        """Holds back requests to `ws_key` after the servers throttled us.
+
+        Returns False if requests to `ws_key` aren't rate limited.
+        """
+        bucket = self._get_bucket(ws_key)
+        if bucket is None:
+            return False
+        bucket.pause(seconds)
+        return True
+
+    def stats(self):
+        """Returns how often requests waited or were rejected."""
+        with self._lock:
+            return {
+                "waits": self.waits,
+                "waited": self.waited,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,93 @@
+"""Retry policy for iCloud requests."""
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import random
+
+
+class RetryPolicy(object):
+    """Decides whether and when a failed request is retried.
+
+    Delays grow exponentially (`backoff_factor` * 2 ** (attempt - 1), capped
+    at `max_backoff`) with full jitter, unless the server sent a
+    `Retry-After` header, which is honored up to `max_retry_after` seconds.
+
+    Idempotent requests (GET and friends, or any request sent with
+    ``idempotent=True``) are retried on `retry_statuses`, on throttling
+    error codes and on connection errors. Other requests are only retried on
+    `non_idempotent_retry_statuses`, which Apple uses for "not handled,
+    try again" responses.
+    """
+
+    IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+    def __init__(
+        self,
+        max_attempts=3,
+        backoff_factor=0.5,
+        max_backoff=30.0,
+        jitter=True,
+        retry_statuses=(421, 429, 450, 500, 502, 503, 504),
+        non_idempotent_retry_statuses=(421, 429, 450, 500, 503),
+        retry_error_codes=("ACCESS_DENIED",),
+        respect_retry_after=True,
+        max_retry_after=120.0,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.non_idempotent_retry_statuses = frozenset(non_idempotent_retry_statuses)
+        self.retry_error_codes = frozenset(retry_error_codes)
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def is_idempotent(self, method):
+        """Returns True if requests with this method are safe to repeat."""
+        return method.upper() in self.IDEMPOTENT_METHODS
+
+    def should_retry(self, attempt, idempotent, status_code=None, error_code=None):
+        """Returns True if attempt number `attempt` may be followed by another.
+
+        Pass neither `status_code` nor `error_code` for connection errors.
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if error_code is not None:
+            return idempotent and error_code in self.retry_error_codes
+        if status_code is None:
+            return idempotent
+        if idempotent:
+            return status_code in self.retry_statuses
+        return status_code in self.non_idempotent_retry_statuses
+
+    def get_delay(self, attempt, response=None):
+        """Returns the number of seconds to wait before the next attempt."""
+        if self.respect_retry_after and response is not None:
+            retry_after = self._parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+
+        delay = min(self.backoff_factor * (2 ** (attempt - 1)), self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    @staticmethod
+    def _parse_retry_after(value):
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
@@ -1,9 +1,27 @@
-"""Services."""
-from pyicloud.services.calendar import CalendarService
-from pyicloud.services.findmyiphone import FindMyiPhoneServiceManager
-from pyicloud.services.ubiquity import UbiquityService
-from pyicloud.services.contacts import ContactsService
-from pyicloud.services.reminders import RemindersService
-from pyicloud.services.photos import PhotosService
-from pyicloud.services.account import AccountService
-from pyicloud.services.drive import DriveService
+"""Services.
+
+Each service module is imported on first access to its class.
+"""
+import importlib
+
+_SERVICE_MODULES = {
+    "CalendarService": "pyicloud.services.calendar",
+    "FindMyiPhoneServiceManager": "pyicloud.services.findmyiphone",
+    "UbiquityService": "pyicloud.services.ubiquity",
+    "ContactsService": "pyicloud.services.contacts",
+    "RemindersService": "pyicloud.services.reminders",
+    "PhotosService": "pyicloud.services.photos",
+    "AccountService": "pyicloud.services.account",
+    "DriveService": "pyicloud.services.drive",
+}
+
+__all__ = list(_SERVICE_MODULES)
+
+
+def __getattr__(name):
+    module = _SERVICE_MODULES.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    service_class = getattr(importlib.import_module(module), name)
+    globals()[name] = service_class
+    return service_class
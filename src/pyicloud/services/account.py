@@ -26,6 +26,12 @@ class AccountService(object):
         )
         self._acc_storage_url = "https://setup.icloud.com/setup/ws/1/storageUsageInfo"
 
+    def refresh(self):
+        """Forgets the cached devices, family and storage data."""
+        self._devices = []
+        self._family = []
+        self._storage = None
+
     @property
     def devices(self):
         """Returns current paired devices."""
@@ -33,8 +39,10 @@ class AccountService(object):
             req = self.session.get(self._acc_devices_url, params=self.params)
             response = req.json()
 
-            for device_info in response["devices"]:
-                self._devices.append(AccountDevice(device_info))
+            # Built aside, so concurrent callers never see a partial list
+            self._devices = [
+                AccountDevice(device_info) for device_info in response["devices"]
+            ]
 
         return self._devices
 
@@ -45,15 +53,15 @@ class AccountService(object):
             req = self.session.get(self._acc_family_details_url, params=self.params)
             response = req.json()
             members = response.get("familyMembers", [])
-            for member_info in members:
-                self._family.append(
-                    FamilyMember(
-                        member_info,
-                        self.session,
-                        self.params,
-                        self._acc_family_member_photo_url,
-                    )
+            self._family = [
+                FamilyMember(
+                    member_info,
+                    self.session,
+                    self.params,
+                    self._acc_family_member_photo_url,
                 )
+                for member_info in members
+            ]
 
         return self._family
 
@@ -19,11 +19,8 @@ class ContactsService(object):
         self.response = {}
         self.order = "first,last"
 
-    def refresh_client(self):
-        """
-        Refreshes the ContactsService endpoint, ensuring that the
-        contacts data is up-to-date.
-        """
+    def _refresh_startup(self):
+        """Fetches the tokens needed to list contacts."""
         params_contacts = dict(self.params)
         params_contacts.update(
             {"clientVersion": "2.1", "locale": "en_US", "order": self.order,}
@@ -40,6 +37,14 @@ class ContactsService(object):
                 "offset": "0",
             }
         )
+        return params_next
+
+    def refresh_client(self):
+        """
+        Refreshes the ContactsService endpoint, ensuring that the
+        contacts data is up-to-date.
+        """
+        params_next = self._refresh_startup()
         req = self.session.get(self._contacts_next_url, params=params_next)
         self.response = req.json()
 
@@ -49,3 +54,13 @@ class ContactsService(object):
         """
         self.refresh_client()
         return self.response.get("contacts")
+
+    def iter_all(self):
+        """
+        Yields all contacts one at a time, decoding them as they are
+        downloaded rather than materializing the whole response.
+        """
+        params_next = self._refresh_startup()
+        self.response = yield from self.session.iter_json_array(
+            "GET", self._contacts_next_url, "contacts", params=params_next
+        )
@@ -42,6 +42,7 @@ class DriveService(object):
                     }
                 ]
             ),
+            idempotent=True,
         )
         return request.json()[0]
 
@@ -77,7 +78,8 @@ class DriveService(object):
         file_size = file_object.tell()
         file_object.seek(orig_pos, os.SEEK_SET)
 
-        file_params = self.params
+        # Copy, as self.params is shared with concurrent requests
+        file_params = dict(self.params)
         file_params.update(self._get_token_from_cookie())
 
         request = self.session.post(
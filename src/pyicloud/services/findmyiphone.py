@@ -1,22 +1,53 @@
 """Find my iPhone service."""
+from collections import namedtuple
+import asyncio
 import json
+import logging
+import queue
+import threading
+import time
 
 from six import PY2, text_type
 
 from pyicloud.exceptions import PyiCloudNoDevicesException
 
+LOGGER = logging.getLogger(__name__)
+
+# Seconds a Find My snapshot is used before device reads refresh it
+DEFAULT_MAX_AGE = 10.0
+
+# Published by a LocationPoller when a device's data changed. `location`
+# and `previous_location` are None when unknown; `moved` tells whether the
+# coordinates changed.
+DeviceEvent = namedtuple(
+    "DeviceEvent", ["device_id", "device", "location", "previous_location", "moved"]
+)
+
 
 class FindMyiPhoneServiceManager(object):
     """The 'Find my iPhone' iCloud service
 
     This connects to iCloud and return phone data including the near-realtime
     latitude and longitude.
+
+    Device data comes from a snapshot of the whole fleet. `status()` and
+    `location()` reuse it while younger than `max_age` seconds; call
+    `refresh()` to get a new one explicitly.
     """
 
-    def __init__(self, service_root, session, params, with_family=False):
+    def __init__(
+        self, service_root, session, params, with_family=False, max_age=DEFAULT_MAX_AGE
+    ):
         self.session = session
         self.params = params
         self.with_family = with_family
+        self.max_age = max_age
+        self._refreshed = None
+        # Echoed back to the server, which can then skip unchanged data
+        self._server_context = None
+        self._device_list_version = 1
+        self.changed = []
+        self._poller = None
 
         fmip_endpoint = "%s/fmipservice/client/web" % service_root
         self._fmip_refresh_url = "%s/refreshClient" % fmip_endpoint
@@ -25,33 +56,82 @@ class FindMyiPhoneServiceManager(object):
         self._fmip_lost_url = "%s/lostDevice" % fmip_endpoint
 
         self._devices = {}
+        self._lock = threading.Lock()
         self.refresh_client()
 
-    def refresh_client(self):
+    def refresh_client(self, device_id=None, locate=True):
         """Refreshes the FindMyiPhoneService endpoint,
 
-        This ensures that the location data is up-to-date.
+        This ensures that the location data is up-to-date. Pass `device_id`
+        to only ask for one device, and ``locate=False`` to get the last
+        known locations without locating the devices again.
 
+        Returns the ids of the devices that changed; the `AppleDevice`
+        objects of the others are left untouched.
         """
+        with self._lock:
+            return self._refresh_client(device_id, locate)
+
+    refresh = refresh_client
+
+    @property
+    def age(self):
+        """Seconds since the snapshot was taken, None before the first one."""
+        if self._refreshed is None:
+            return None
+        return time.monotonic() - self._refreshed
+
+    def refresh_if_stale(self, max_age=None):
+        """Refreshes the snapshot if older than `max_age` (default: `self.max_age`).
+
+        Returns True if it was refreshed.
+        """
+        if max_age is None:
+            max_age = self.max_age
+        with self._lock:
+            # Checked under the lock, so concurrent readers refresh once
+            age = self.age
+            if age is not None and age < max_age:
+                return False
+            self._refresh_client()
+            return True
+
+    def _refresh_client(self, device_id=None, locate=True):
+        data = {
+            "clientContext": {
+                "fmly": self.with_family,
+                "shouldLocate": locate,
+                "selectedDevice": device_id or "all",
+                "deviceListVersion": self._device_list_version,
+            }
+        }
+        if self._server_context:
+            data["serverContext"] = self._server_context
         req = self.session.post(
             self._fmip_refresh_url,
             params=self.params,
-            data=json.dumps(
-                {
-                    "clientContext": {
-                        "fmly": self.with_family,
-                        "shouldLocate": True,
-                        "selectedDevice": "all",
-                        "deviceListVersion": 1,
-                    }
-                }
-            ),
+            data=json.dumps(data),
+            idempotent=True,
         )
         self.response = req.json()
+        if device_id is None:
+            self._refreshed = time.monotonic()
 
-        for device_info in self.response["content"]:
+        self._server_context = self.response.get("serverContext") or (
+            self._server_context
+        )
+        version = (self._server_context or {}).get(
+            "deviceListVersion", self.response.get("deviceListVersion")
+        )
+        if version:
+            self._device_list_version = version
+
+        # Devices missing from the content didn't change, or weren't asked for
+        changed = []
+        for device_info in self.response.get("content") or []:
             device_id = device_info["id"]
-            if device_id not in self._devices:
+            device = self._devices.get(device_id)
+            if device is None:
                 self._devices[device_id] = AppleDevice(
                     device_info,
                     self.session,
@@ -61,11 +141,27 @@ class FindMyiPhoneServiceManager(object):
                     lost_url=self._fmip_lost_url,
                     message_url=self._fmip_message_url,
                 )
+            elif device.content != device_info:
+                device.update(device_info)
             else:
-                self._devices[device_id].update(device_info)
+                continue
+            changed.append(device_id)
+        self.changed = changed
 
         if not self._devices:
             raise PyiCloudNoDevicesException()
+        return changed
+
+    def poller(self, **kwargs):
+        """Returns the background location poller of this manager.
+
+        It's shared: every consumer subscribes to the same polling stream.
+        Arguments (see `LocationPoller`) only apply when it's created.
+        """
+        with self._lock:
+            if self._poller is None:
+                self._poller = LocationPoller(self, **kwargs)
+            return self._poller
 
     def __getitem__(self, key):
         if isinstance(key, int):
@@ -117,17 +213,28 @@ class AppleDevice(object):
         """Updates the device data."""
         self.content = data
 
-    def location(self):
-        """Updates the device location."""
-        self.manager.refresh_client()
+    def refresh(self, locate=True):
+        """Refreshes this device only, returning True if it changed."""
+        return bool(self.manager.refresh_client(self.content["id"], locate))
+
+    def location(self, max_age=None):
+        """Updates the device location.
+
+        The fleet snapshot is only refreshed if older than `max_age` seconds
+        (default: the manager's `max_age`); pass 0 to always refresh.
+        """
+        self.manager.refresh_if_stale(max_age)
         return self.content["location"]
 
-    def status(self, additional=[]):  # pylint: disable=dangerous-default-value
+    def status(
+        self, additional=[], max_age=None
+    ):  # pylint: disable=dangerous-default-value
         """Returns status information for device.
 
-        This returns only a subset of possible properties.
+        This returns only a subset of possible properties. The snapshot is
+        refreshed as for `location`.
         """
-        self.manager.refresh_client()
+        self.manager.refresh_if_stale(max_age)
         fields = ["batteryLevel", "deviceDisplayName", "deviceStatus", "name"]
         fields += additional
         properties = {}
@@ -213,3 +320,178 @@ class AppleDevice(object):
 
     def __repr__(self):
         return "<AppleDevice(%s)>" % str(self)
+
+
+def _coordinates(location):
+    if not location:
+        return None
+    return (location.get("latitude"), location.get("longitude"))
+
+
+class LocationPoller(object):
+    """Polls Find My in the background and publishes device changes.
+
+    The interval adapts: it drops to `min_interval` seconds while a device
+    moves or is being located, then grows by `backoff` after every quiet
+    poll, up to `max_interval`. Each change is published as a `DeviceEvent`
+    to the subscribed callbacks, queues and async iterators, all fed by a
+    single refresh per poll.
+
+    Usage:
+        poller = api.devices.poller(min_interval=5, max_interval=120)
+        poller.subscribe(lambda event: print(event.device_id, event.location))
+        poller.start()
+    """
+
+    def __init__(
+        self, manager, min_interval=5.0, max_interval=120.0, backoff=2.0, locate=True
+    ):
+        self.manager = manager
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.locate = locate
+        self.interval = min_interval
+
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._seen = {}
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback, device_id=None):
+        """Calls `callback(event)` on the poller thread for every change.
+
+        Pass `device_id` to only get the events of one device. Returns the
+        callback, to be passed to `unsubscribe`.
+        """
+        return self._subscribe(callback, device_id, callback)
+
+    def _subscribe(self, callback, device_id, owner):
+        with self._lock:
+            self._subscribers.append((callback, device_id, owner))
+        return owner
+
+    def unsubscribe(self, callback):
+        """Stops publishing to a callback or queue."""
+        with self._lock:
+            self._subscribers = [
+                subscriber
+                for subscriber in self._subscribers
+                if subscriber[2] is not callback
+            ]
+
+    def queue(self, device_id=None, maxsize=0):
+        """Returns a `queue.Queue` receiving the events.
+
+        Events are dropped, with a warning, while a bounded queue is full.
+        """
+        events = queue.Queue(maxsize)
+
+        def put(event):
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                LOGGER.warning("Dropping %s event, queue is full", event.device_id)
+
+        return self._subscribe(put, device_id, events)
+
+    async def events(self, device_id=None):
+        """Asynchronously iterates the events, e.g. ``async for event in ...``."""
+        loop = asyncio.get_event_loop()
+        events = asyncio.Queue()
+
+        def put(event):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        self.subscribe(put, device_id)
+        try:
+            while True:
+                yield await events.get()
+        finally:
+            self.unsubscribe(put)
+
+    def start(self):
+        """Starts polling on a daemon thread."""
+        with self._lock:
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="pyicloud-findmy-poller"
+                )
+                self._thread.daemon = True
+                self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops polling."""
+        self._stopped.set()
+        self._wake.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def wake(self):
+        """Polls right away, e.g. after asking a device to play a sound."""
+        self.interval = self.min_interval
+        self._wake.set()
+
+    def poll(self):
+        """Refreshes once, publishes the changes and adapts the interval.
+
+        Returns the published events.
+        """
+        self.manager.refresh_client(locate=self.locate)
+
+        events = []
+        active = False
+        for device_id, device in list(self.manager.items()):
+            content = device.content
+            if content.get("isLocating"):
+                active = True
+            previous = self._seen.get(device_id)
+            # Unchanged devices keep their content object
+            if previous is content:
+                continue
+            self._seen[device_id] = content
+            location = content.get("location")
+            previous_location = previous.get("location") if previous else None
+            moved = previous is not None and _coordinates(location) != _coordinates(
+                previous_location
+            )
+            active = active or moved
+            events.append(
+                DeviceEvent(device_id, device, location, previous_location, moved)
+            )
+
+        if active:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+        self._publish(events)
+        return events
+
+    def _publish(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for event in events:
+            for callback, device_id, _ in subscribers:
+                if device_id is not None and device_id != event.device_id:
+                    continue
+                try:
+                    callback(event)
+                except Exception:  # pylint: disable=broad-except
+                    LOGGER.exception("Find My subscriber failed")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll()
+            except Exception as error:  # pylint: disable=broad-except
+                LOGGER.warning("Find My poll failed: %s", error)
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -315,8 +315,10 @@ class PhotoAlbum(object):
             url = ("%s/records/query?" % self.service.service_endpoint) + urlencode(
                 self.service.params
             )
-            request = self.service.session.post(
+            records = self.service.session.iter_json_array(
+                "POST",
                 url,
+                "records",
                 data=json.dumps(
                     self._list_query_gen(
                         offset, self.list_type, self.direction, self.query_filter
@@ -324,29 +326,34 @@ class PhotoAlbum(object):
                 ),
                 headers={"Content-type": "text/plain"},
             )
-            response = request.json()
 
+            # Records are decoded one at a time, and a photo is yielded as
+            # soon as both its asset and master records have arrived.
             asset_records = {}
-            master_records = []
-            for rec in response["records"]:
+            master_records = {}
+            master_records_len = 0
+            for rec in records:
                 if rec["recordType"] == "CPLAsset":
                     master_id = rec["fields"]["masterRef"]["value"]["recordName"]
-                    asset_records[master_id] = rec
+                    master_record = master_records.pop(master_id, None)
+                    if master_record is None:
+                        asset_records[master_id] = rec
+                        continue
+                    yield PhotoAsset(self.service, master_record, rec)
                 elif rec["recordType"] == "CPLMaster":
-                    master_records.append(rec)
+                    master_records_len += 1
+                    record_name = rec["recordName"]
+                    asset_record = asset_records.pop(record_name, None)
+                    if asset_record is None:
+                        master_records[record_name] = rec
+                        continue
+                    yield PhotoAsset(self.service, rec, asset_record)
 
-            master_records_len = len(master_records)
             if master_records_len:
                 if self.direction == "DESCENDING":
                     offset = offset - master_records_len
                 else:
                     offset = offset + master_records_len
-
-                for master_record in master_records:
-                    record_name = master_record["recordName"]
-                    yield PhotoAsset(
-                        self.service, master_record, asset_records[record_name]
-                    )
             else:
                 break
 
@@ -0,0 +1,311 @@
+"""Session persistence."""
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import http.cookiejar as cookielib
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _cookie_to_dict(cookie):
+    """Returns the attributes needed to rebuild a cookie."""
+    return {
+        "version": cookie.version,
+        "name": cookie.name,
+        "value": cookie.value,
+        "port": cookie.port,
+        "port_specified": cookie.port_specified,
+        "domain": cookie.domain,
+        "domain_specified": cookie.domain_specified,
+        "domain_initial_dot": cookie.domain_initial_dot,
+        "path": cookie.path,
+        "path_specified": cookie.path_specified,
+        "secure": cookie.secure,
+        "expires": cookie.expires,
+        "discard": cookie.discard,
+        "comment": cookie.comment,
+        "comment_url": cookie.comment_url,
+        "rest": cookie._rest,  # pylint: disable=protected-access
+        "rfc2109": cookie.rfc2109,
+    }
+
+
+def _cookies_fingerprint(cookies):
+    """Returns a snapshot of the cookies, keyed by domain, path and name."""
+    return {
+        (cookie.domain, cookie.path, cookie.name): _cookie_to_dict(cookie)
+        for cookie in cookies
+    }
+
+
+def _replace_atomically(filename, write):
+    """Writes a file through a temporary sibling, then renames it in place."""
+    tmp_filename = "%s.%d.tmp" % (filename, os.getpid())
+    try:
+        write(tmp_filename)
+        os.replace(tmp_filename, filename)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+
+class SessionStore(object):
+    """Write-behind store for session data and cookies.
+
+    Writes only happen when the session data or cookies actually changed and
+    are batched on a short debounce. Pending changes are flushed on
+    interpreter exit. Subclasses implement the actual storage.
+    """
+
+    def __init__(self, delay=1.0):
+        self.delay = delay
+
+        self._lock = threading.RLock()
+        self._timer = None
+        self._saved_session_data = None
+        self._saved_cookies = None
+        self._session_data = None
+        self._cookies = None
+
+        atexit.register(self.close)
+
+    def load_session_data(self):
+        """Returns the stored session data, or an empty dict."""
+        session_data = self._read_session_data()
+        self._saved_session_data = dict(session_data)
+        return session_data
+
+    def load_cookies(self, cookies):
+        """Loads the stored cookies into a cookie jar."""
+        self._read_cookies(cookies)
+        self._saved_cookies = _cookies_fingerprint(cookies)
+
+    def save(self, session_data, cookies):
+        """Schedules a write if the session data or cookies changed."""
+        with self._lock:
+            session_changed = session_data != self._saved_session_data
+            cookies_changed = _cookies_fingerprint(cookies) != self._saved_cookies
+            if not (session_changed or cookies_changed):
+                return False
+            if session_changed:
+                self._session_data = session_data
+            if cookies_changed:
+                self._cookies = cookies
+
+            if not self.delay:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return True
+
+    def flush(self):
+        """Writes pending changes to the store."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            if self._session_data is not None:
+                session_data = dict(self._session_data)
+                self._write_session_data(session_data, self._saved_session_data)
+                self._saved_session_data = session_data
+                self._session_data = None
+
+            if self._cookies is not None:
+                # Copy first so a concurrent request can't mutate the jar
+                # while it's written.
+                snapshot = cookielib.LWPCookieJar()
+                for cookie in self._cookies:
+                    snapshot.set_cookie(cookie)
+                fingerprint = _cookies_fingerprint(snapshot)
+                self._write_cookies(snapshot, fingerprint, self._saved_cookies)
+                self._saved_cookies = fingerprint
+                self._cookies = None
+
+    def close(self):
+        """Flushes pending changes and stops the store."""
+        self.flush()
+        atexit.unregister(self.close)
+
+    def _read_session_data(self):
+        raise NotImplementedError
+
+    def _read_cookies(self, cookies):
+        raise NotImplementedError
+
+    def _write_session_data(self, session_data, previous):
+        raise NotImplementedError
+
+    def _write_cookies(self, cookies, fingerprint, previous):
+        raise NotImplementedError
+
+
+class FileSessionStore(SessionStore):
+    """Session store keeping a ``<account>.session`` JSON file and an LWP
+    cookie jar per account. Files are replaced with an atomic rename.
+    """
+
+    def __init__(self, session_path, cookiejar_path, delay=1.0):
+        super(FileSessionStore, self).__init__(delay)
+        self.session_path = session_path
+        self.cookiejar_path = cookiejar_path
+
+    def _read_session_data(self):
+        session_data = {}
+        try:
+            with open(self.session_path) as session_f:
+                session_data = json.load(session_f)
+        except:  # pylint: disable=bare-except
+            LOGGER.info("Session file does not exist")
+        return session_data
+
+    def _read_cookies(self, cookies):
+        if os.path.exists(self.cookiejar_path):
+            try:
+                cookies.load(
+                    self.cookiejar_path, ignore_discard=True, ignore_expires=True
+                )
+                LOGGER.debug("Read cookies from %s", self.cookiejar_path)
+            except:  # pylint: disable=bare-except
+                # Most likely a pickled cookiejar from earlier versions.
+                # The cookiejar will get replaced with a valid one after
+                # successful authentication.
+                LOGGER.warning("Failed to read cookiejar %s", self.cookiejar_path)
+
+    def _write_session_data(self, session_data, previous):
+        def write(filename):
+            with open(filename, "w") as outfile:
+                json.dump(session_data, outfile)
+
+        _replace_atomically(self.session_path, write)
+        LOGGER.debug("Saved session data to %s", self.session_path)
+
+    def _write_cookies(self, cookies, fingerprint, previous):
+        _replace_atomically(
+            self.cookiejar_path,
+            lambda filename: cookies.save(
+                filename, ignore_discard=True, ignore_expires=True
+            ),
+        )
+        LOGGER.debug("Cookies saved to %s", self.cookiejar_path)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store keeping many accounts in a single SQLite database.
+
+    Session data and cookies are stored one row per key/cookie, indexed by
+    account, and only the rows that changed are written, in one
+    transaction. The database runs in WAL mode so other processes can keep
+    reading while an account is being saved.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS session_data ("
+        "account TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+        "PRIMARY KEY (account, key)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS cookies ("
+        "account TEXT NOT NULL, domain TEXT NOT NULL, path TEXT NOT NULL, "
+        "name TEXT NOT NULL, cookie TEXT NOT NULL, "
+        "PRIMARY KEY (account, domain, path, name)) WITHOUT ROWID",
+    )
+
+    def __init__(self, database_path, account, delay=1.0, timeout=30.0):
+        super(SQLiteSessionStore, self).__init__(delay)
+        self.database_path = database_path
+        self.account = account
+
+        self._connection = sqlite3.connect(
+            database_path, timeout=timeout, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            for statement in self.SCHEMA:
+                self._connection.execute(statement)
+
+    def _read_session_data(self):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key, value FROM session_data WHERE account = ?",
+                (self.account,),
+            ).fetchall()
+        return {key: json.loads(value) for (key, value) in rows}
+
+    def _read_cookies(self, cookies):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT cookie FROM cookies WHERE account = ?", (self.account,)
+            ).fetchall()
+        for (cookie,) in rows:
+            cookies.set_cookie(cookielib.Cookie(**json.loads(cookie)))
+        LOGGER.debug("Read %d cookies for %s", len(rows), self.account)
+
+    def _write_session_data(self, session_data, previous):
+        previous = previous or {}
+        upserts = [
+            (self.account, key, json.dumps(value))
+            for (key, value) in session_data.items()
+            if key not in previous or previous[key] != value
+        ]
+        deletes = [(self.account, key) for key in previous if key not in session_data]
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO session_data (account, key, value) "
+                "VALUES (?, ?, ?)",
+                upserts,
+            )
+            self._connection.executemany(
+                "DELETE FROM session_data WHERE account = ? AND key = ?", deletes
+            )
+        LOGGER.debug(
+            "Saved session data for %s (%d changed, %d removed)",
+            self.account,
+            len(upserts),
+            len(deletes),
+        )
+
+    def _write_cookies(self, cookies, fingerprint, previous):
+        previous = previous or {}
+        upserts = [
+            (self.account, key[0], key[1], key[2], json.dumps(cookie))
+            for (key, cookie) in fingerprint.items()
+            if key not in previous or previous[key] != cookie
+        ]
+        deletes = [
+            (self.account,) + key for key in previous if key not in fingerprint
+        ]
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO cookies (account, domain, path, name, cookie) "
+                "VALUES (?, ?, ?, ?, ?)",
+                upserts,
+            )
+            self._connection.executemany(
+                "DELETE FROM cookies "
+                "WHERE account = ? AND domain = ? AND path = ? AND name = ?",
+                deletes,
+            )
+        LOGGER.debug(
+            "Saved cookies for %s (%d changed, %d removed)",
+            self.account,
+            len(upserts),
+            len(deletes),
+        )
+
+    def accounts(self):
+        """Returns the accounts with stored session data."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT DISTINCT account FROM session_data"
+            ).fetchall()
+        return [account for (account,) in rows]
+
+    def close(self):
+        """Flushes pending changes and closes the database."""
+        super(SQLiteSessionStore, self).close()
+        self._connection.close()
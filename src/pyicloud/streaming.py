@@ -0,0 +1,109 @@
+"""Incremental JSON decoding of large responses."""
+import codecs
+import json
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",:]}"
+
+
+class JSONArrayStream(object):
+    """Yields the items of one top-level array of a JSON object response.
+
+    The body is read in chunks as it's iterated, and each item is decoded
+    on its own, so memory use is bounded by the largest item rather than
+    the whole payload. The other top-level members end up in `rest` once
+    iteration is over. Request the response with ``stream=True``.
+
+    Usage:
+        stream = JSONArrayStream(response, "contacts")
+        for contact in stream:
+            ...
+        sync_token = stream.rest.get("syncToken")
+    """
+
+    def __init__(self, response, key, chunk_size=64 * 1024):
+        self.response = response
+        self.key = key
+        self.chunk_size = chunk_size
+        self.rest = {}
+
+        self._chunks = None
+        self._decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Reads one more chunk; returns False at the end of the body."""
+        if self._eof:
+            return False
+        if self._chunks is None:
+            self._chunks = self.response.iter_content(self.chunk_size)
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            text = self._decoder.decode(b"", final=True)
+        else:
+            text = self._decoder.decode(chunk)
+        if self._pos > len(self._buffer) // 2:
+            self._buffer = self._buffer[self._pos :]
+            self._pos = 0
+        self._buffer += text
+        return True
+
+    def _peek(self):
+        """Returns the next non-whitespace character, without consuming it."""
+        while True:
+            while self._pos < len(self._buffer):
+                char = self._buffer[self._pos]
+                if char not in _WHITESPACE:
+                    return char
+                self._pos += 1
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(
+                "Expected %r at %d, got %r" % (char, self._pos, self._peek())
+            )
+        self._pos += 1
+
+    def _value(self):
+        """Decodes the next complete value."""
+        self._peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # A number could be cut short by the chunk boundary
+            if (
+                end == len(self._buffer) or self._buffer[end] not in _DELIMITERS
+            ) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def __iter__(self):
+        try:
+            self._expect("{")
+            while self._peek() != "}":
+                name = self._value()
+                self._expect(":")
+                if name == self.key and self._peek() == "[":
+                    self._pos += 1
+                    while self._peek() != "]":
+                        yield self._value()
+                        if self._peek() == ",":
+                            self._pos += 1
+                    self._pos += 1
+                else:
+                    self.rest[name] = self._value()
+                if self._peek() == ",":
+                    self._pos += 1
+        finally:
+            self.response.close()
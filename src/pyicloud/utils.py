@@ -1,6 +1,5 @@
 """Utils."""
 import getpass
-import keyring
 from sys import stdout
 
 from .exceptions import PyiCloudNoStoredPasswordAvailableException
@@ -34,6 +33,8 @@ def password_exists_in_keyring(username):
 
 def get_password_from_keyring(username):
     """Get the password from a username."""
+    import keyring  # pylint: disable=import-outside-toplevel
+
     result = keyring.get_password(KEYRING_SYSTEM, username)
     if result is None:
         raise PyiCloudNoStoredPasswordAvailableException(
@@ -48,11 +49,15 @@ def get_password_from_keyring(username):
 
 def store_password_in_keyring(username, password):
     """Store the password of a username."""
+    import keyring  # pylint: disable=import-outside-toplevel
+
     return keyring.set_password(KEYRING_SYSTEM, username, password)
 
 
 def delete_password_in_keyring(username):
     """Delete the password of a username."""
+    import keyring  # pylint: disable=import-outside-toplevel
+
     return keyring.delete_password(KEYRING_SYSTEM, username)
 
 
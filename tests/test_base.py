@@ -0,0 +1,26 @@
+"""Tests for pyicloud.base."""
+import logging
+
+from pyicloud.base import LogPayload, PyiCloudPasswordFilter
+
+
+def _filtered(msg, *args):
+    record = logging.LogRecord(
+        "pyicloud.base", logging.ERROR, __file__, 1, msg, args, None
+    )
+    PyiCloudPasswordFilter("hunter2").filter(record)
+    return record.getMessage()
+
+
+def test_password_filter_redacts_format_args():
+    assert _filtered("login %s failed", "hunter2") == "login ******** failed"
+
+
+def test_password_filter_redacts_payloads():
+    message = _filtered("payload %s", LogPayload({"password": "hunter2"}, 2048))
+    assert "hunter2" not in message
+
+
+def test_password_filter_redacts_non_string_messages():
+    assert "hunter2" not in _filtered(ValueError("bad login hunter2"))
+    assert "hunter2" not in _filtered({"password": "hunter2"})
@@ -0,0 +1,24 @@
+"""Tests for pyicloud.retry."""
+from pyicloud.retry import RetryPolicy
+
+
+def test_should_retry_connection_errors_when_idempotent():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry(1, True)
+    assert not policy.should_retry(1, False)
+    assert not policy.should_retry(3, True)
+
+
+def test_should_retry_statuses():
+    policy = RetryPolicy()
+    assert policy.should_retry(1, True, status_code=502)
+    assert not policy.should_retry(1, False, status_code=502)
+    assert policy.should_retry(1, False, status_code=503)
+    assert not policy.should_retry(1, True, status_code=404)
+
+
+def test_should_retry_error_codes():
+    policy = RetryPolicy()
+    assert policy.should_retry(1, True, error_code="ACCESS_DENIED")
+    assert not policy.should_retry(1, False, error_code="ACCESS_DENIED")
+    assert not policy.should_retry(1, True, error_code="ZONE_NOT_FOUND")
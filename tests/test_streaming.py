@@ -0,0 +1,189 @@
+"""Tests for pyicloud.streaming and PyiCloudSession.iter_json_array."""
+import io
+import json
+
+import pytest
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+from fake_icloud import FakeICloudServer
+from pyicloud.exceptions import (
+    PyiCloudAPIResponseException,
+    PyiCloudServiceNotActivatedException,
+)
+from pyicloud.retry import RetryPolicy
+from pyicloud.streaming import JSONArrayStream
+
+
+class FakeResponse(object):
+    """Response serving its body in fixed-size chunks."""
+
+    def __init__(self, body, encoding="utf-8"):
+        self.body = body.encode(encoding) if isinstance(body, str) else body
+        self.encoding = encoding
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start : start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+def _stream(body, key="items", chunk_size=1):
+    stream = JSONArrayStream(FakeResponse(body), key, chunk_size)
+    return list(stream), stream.rest
+
+
+DOCUMENT = {
+    "before": {"nested": [1, 2, {"x": "]}"}]},
+    "items": [
+        "plain",
+        "esc\"aped \\ é中 😀 \n\t/",
+        12345678901234567890,
+        -1.5e-10,
+        0,
+        True,
+        None,
+        {"items": ["not", "this", "one"], "n": 3.25},
+        [],
+    ],
+    "after": "trailing, with } and ]",
+    "count": 42,
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64, 65536])
+def test_chunk_boundaries(chunk_size):
+    body = json.dumps(DOCUMENT)
+    items, rest = _stream(body, chunk_size=chunk_size)
+    assert items == DOCUMENT["items"]
+    assert rest == {
+        "before": DOCUMENT["before"],
+        "after": DOCUMENT["after"],
+        "count": 42,
+    }
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3])
+def test_unescaped_unicode_split_across_chunks(chunk_size):
+    body = json.dumps({"items": ["é中\U0001f600"]}, ensure_ascii=False)
+    assert _stream(body, chunk_size=chunk_size)[0] == ["é中\U0001f600"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 4])
+def test_numbers_at_chunk_boundaries(chunk_size):
+    body = '{"items":[1234567,8.25e3,-0.5,99],"total":1234567}'
+    items, rest = _stream(body, chunk_size=chunk_size)
+    assert items == [1234567, 8250.0, -0.5, 99]
+    assert rest == {"total": 1234567}
+
+
+def test_pretty_printed_document():
+    body = json.dumps(DOCUMENT, indent=4)
+    assert _stream(body, chunk_size=10)[0] == DOCUMENT["items"]
+
+
+def test_empty_array():
+    assert _stream('{"items": [], "syncToken": "t"}') == ([], {"syncToken": "t"})
+
+
+def test_missing_array():
+    assert _stream('{"errorCode": "X", "reason": "r"}') == (
+        [],
+        {"errorCode": "X", "reason": "r"},
+    )
+
+
+def test_array_under_another_key_is_kept():
+    assert _stream('{"other": [1, 2]}', key="items") == ([], {"other": [1, 2]})
+
+
+def test_response_closed_after_iteration():
+    response = FakeResponse('{"items": [1]}')
+    list(JSONArrayStream(response, "items"))
+    assert response.closed
+
+
+def test_truncated_document():
+    with pytest.raises(ValueError):
+        _stream('{"items": [1, 2')
+
+
+class CannedAdapter(HTTPAdapter):
+    """Transport answering every request with the next canned JSON body."""
+
+    def __init__(self, bodies):
+        super(CannedAdapter, self).__init__()
+        self.bodies = list(bodies)
+        self.requests = 0
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        self.requests += 1
+        body = json.dumps(self.bodies.pop(0)).encode("utf-8")
+        raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers={"Content-Type": "application/json"},
+            status=200,
+            preload_content=False,
+        )
+        return self.build_response(request, raw)
+
+
+@pytest.fixture(name="api")
+def fixture_api(tmp_path):
+    server = FakeICloudServer().start()
+    try:
+        yield server.service_class()(
+            "a@b.c", "pw", cookie_directory=str(tmp_path), session_save_delay=0
+        )
+    finally:
+        server.stop()
+
+
+def _mount(api, bodies):
+    adapter = CannedAdapter(bodies)
+    api.session.mount("http://canned.test/", adapter)
+    api.session.retry_policy = RetryPolicy(backoff_factor=0)
+    return adapter
+
+
+def test_iter_json_array_returns_rest(api):
+    _mount(api, [{"records": [{"n": 1}, {"n": 2}], "syncToken": "t"}])
+    stream = api.session.iter_json_array("GET", "http://canned.test/q", "records")
+    items = []
+    with pytest.raises(StopIteration) as stop:
+        while True:
+            items.append(next(stream))
+    assert items == [{"n": 1}, {"n": 2}]
+    assert stop.value.value == {"syncToken": "t"}
+
+
+def test_iter_json_array_raises_body_errors(api):
+    _mount(api, [{"serverErrorCode": "ZONE_NOT_FOUND", "reason": "no zone"}])
+    with pytest.raises(PyiCloudServiceNotActivatedException):
+        list(api.session.iter_json_array("POST", "http://canned.test/q", "records"))
+
+
+def test_iter_json_array_retries_throttling(api):
+    throttled = {"errorCode": "ACCESS_DENIED", "reason": "slow down"}
+    adapter = _mount(api, [throttled, {"records": [1, 2]}])
+    records = api.session.iter_json_array("GET", "http://canned.test/q", "records")
+    assert list(records) == [1, 2]
+    assert adapter.requests == 2
+
+
+def test_iter_json_array_gives_up_retrying(api):
+    throttled = {"errorCode": "ACCESS_DENIED", "reason": "slow down"}
+    adapter = _mount(api, [throttled] * 3)
+    with pytest.raises(PyiCloudAPIResponseException):
+        list(api.session.iter_json_array("GET", "http://canned.test/q", "records"))
+    assert adapter.requests == 3
+
+
+def test_iter_json_array_doesnt_retry_codeless_errors(api):
+    adapter = _mount(api, [{"error": "nope"}])
+    with pytest.raises(PyiCloudAPIResponseException):
+        list(api.session.iter_json_array("GET", "http://canned.test/q", "records"))
+    assert adapter.requests == 1